@@ -0,0 +1,229 @@
+"""Load the coordinate columns of a GFF/GTF file into NumPy arrays.
+
+Each feature line becomes one row.  The text columns that repeat (seqid,
+source, type) are stored as integer codes into a list of names, and the
+attributes column is left in the file, to be read back by row offset.
+
+    from fungidb_tools.gff.Columnar import parse_columnar
+
+    cols = parse_columnar('genome.gff3')
+    genes = cols.soterm == cols.code('soterm', 'gene')
+    print(cols.lengths()[genes].sum())
+    for i in cols.order():
+        ...
+
+NumPy is only needed by this module, so it is imported on first use.
+"""
+
+from __future__ import print_function, unicode_literals
+from array import array
+from . import GFF2Parser as g2
+from . import GFF3Parser as gp
+
+STRANDS = {b'+': 1, b'-': -1}
+PHASES = {b'0': 0, b'1': 1, b'2': 2}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("parse_columnar requires numpy")
+    return numpy
+
+
+class _Codes(object):
+
+    """Map repeated strings to small integer codes, in order of appearance."""
+
+    __slots__ = ('codes', 'names')
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def __call__(self, value):
+        try:
+            return self.codes[value]
+        except KeyError:
+            code = self.codes[value] = len(self.names)
+            self.names.append(value.decode('utf-8'))
+            return code
+
+
+class GFFColumns(object):
+
+    """Column arrays for the feature lines of a GFF/GTF file.
+
+    Attributes:
+        path String: the file the rows were read from.
+        filetype String: 'gff3', 'gff2' or 'gtf'.
+        seqid Int32 Array: codes into seqids.
+        source Int32 Array: codes into sources.
+        soterm Int32 Array: codes into soterms.
+        start Int64 Array: 1-based start.
+        end Int64 Array: 1-based, inclusive end.
+        strand Int8 Array: 1 for +, -1 for -, 0 for anything else.
+        phase Int8 Array: 0, 1 or 2; -1 for '.'.
+        offset Int64 Array: byte offset of each row's line in the file.
+        seqids String List: seqid names by code.
+        sources String List: source names by code.
+        soterms String List: SO term names by code.
+    """
+
+    def __init__(self, path, filetype, seqid, source, soterm, start, end,
+                 strand, phase, offset, seqids, sources, soterms):
+        self.path = path
+        self.filetype = filetype
+        self.seqid = seqid
+        self.source = source
+        self.soterm = soterm
+        self.start = start
+        self.end = end
+        self.strand = strand
+        self.phase = phase
+        self.offset = offset
+        self.seqids = seqids
+        self.sources = sources
+        self.soterms = soterms
+
+    def __len__(self):
+        return len(self.start)
+
+    def code(self, column, name):
+        """Return the code for a seqid, source or soterm name, or -1."""
+        names = getattr(self, column + 's')
+        try:
+            return names.index(name)
+        except ValueError:
+            return -1
+
+    def lengths(self):
+        return self.end - self.start + 1
+
+    def order(self):
+        """Return the row indices sorted by seqid name, start, then end."""
+        np = _numpy()
+        # Rank the codes by name so rows sort the way the feature classes do.
+        rank = np.argsort(np.argsort(np.array(self.seqids, dtype=str),
+                                     kind='stable'))
+        return np.lexsort((self.end, self.start, rank[self.seqid]))
+
+    def overlapping(self, seqid, start, end):
+        """Return a boolean mask of the rows that overlap the range."""
+        return ((self.seqid == self.code('seqid', seqid)) &
+                (self.start <= end) & (self.end >= start))
+
+    def overlap_pairs(self):
+        """Return (i, j) index arrays of every pair of overlapping rows.
+
+        Each pair is reported once, with the row that sorts first as i.
+        """
+        np = _numpy()
+        order = self.order()
+        seqid = self.seqid[order]
+        start = self.start[order]
+        end = self.end[order]
+
+        left = []
+        right = []
+        # Compare each row with the row k places ahead; starts only grow, so
+        # a row drops out once the row k ahead starts past its end.
+        alive = np.arange(len(order))
+        k = 1
+        while len(alive):
+            alive = alive[alive + k < len(order)]
+            other = alive + k
+            hit = (seqid[other] == seqid[alive]) & (start[other] <= end[alive])
+            alive = alive[hit]
+            left.append(order[alive])
+            right.append(order[other[hit]])
+            k += 1
+        if not left:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(left), np.concatenate(right)
+
+    def line(self, i):
+        """Return row i's line as read from the file."""
+        with open(self.path, 'rb') as infile:
+            infile.seek(int(self.offset[i]))
+            return infile.readline().decode('utf-8').rstrip('\r\n')
+
+    def raw_attributes(self, i):
+        """Return row i's attributes column, or '' if the row has none."""
+        fields = self.line(i).split('\t', 8)
+        return fields[8] if len(fields) > 8 else ''
+
+    def attributes(self, i):
+        """Return row i's attributes decoded by the matching parser."""
+        raw = self.raw_attributes(i)
+        if self.filetype == 'gff3':
+            return gp.parse_attributes(raw)
+        return g2.parse_attributes(raw)[0]
+
+    def take(self, rows):
+        """Return a GFFColumns of the selected rows (mask or indices)."""
+        return GFFColumns(self.path, self.filetype,
+                          self.seqid[rows], self.source[rows],
+                          self.soterm[rows], self.start[rows], self.end[rows],
+                          self.strand[rows], self.phase[rows],
+                          self.offset[rows],
+                          self.seqids, self.sources, self.soterms)
+
+
+def parse_columnar(path, filetype='gff3'):
+    """Read the feature lines of a GFF/GTF file into a GFFColumns.
+
+    Comments and directives are skipped, and reading stops at ##FASTA.  A
+    row may leave out the attributes column.
+    """
+    np = _numpy()
+    seqids = _Codes()
+    sources = _Codes()
+    soterms = _Codes()
+    columns = {
+        'seqid': array('i'), 'source': array('i'), 'soterm': array('i'),
+        'start': array('q'), 'end': array('q'), 'strand': array('b'),
+        'phase': array('b'), 'offset': array('q'),
+    }
+    add_seqid = columns['seqid'].append
+    add_source = columns['source'].append
+    add_soterm = columns['soterm'].append
+    add_start = columns['start'].append
+    add_end = columns['end'].append
+    add_strand = columns['strand'].append
+    add_phase = columns['phase'].append
+    add_offset = columns['offset'].append
+
+    offset = 0
+    with open(path, 'rb') as infile:
+        for n, line in enumerate(infile, 1):
+            here = offset
+            offset += len(line)
+            if line.startswith(b'#'):
+                if line.startswith(b'##FASTA'):
+                    break
+                continue
+            fields = line.split(b'\t', 8)
+            if len(fields) < 8:
+                if line.strip():
+                    raise gp.ParseError("Failed on line %d" % n)
+                continue
+            try:
+                add_start(int(fields[3]))
+                add_end(int(fields[4]))
+            except ValueError:
+                raise gp.ParseError("Failed on line %d" % n)
+            add_seqid(seqids(fields[0]))
+            add_source(sources(fields[1]))
+            add_soterm(soterms(fields[2]))
+            add_strand(STRANDS.get(fields[6], 0))
+            add_phase(PHASES.get(fields[7].strip(), -1))
+            add_offset(here)
+
+    dtypes = {'i': np.int32, 'q': np.int64, 'b': np.int8}
+    arrays = dict((name, np.frombuffer(col, dtype=dtypes[col.typecode]))
+                  for name, col in columns.items())
+    return GFFColumns(path, filetype, seqids=seqids.names,
+                      sources=sources.names, soterms=soterms.names, **arrays)
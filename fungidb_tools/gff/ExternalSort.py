@@ -0,0 +1,76 @@
+"""Sort more items than fit in memory by spilling sorted runs to disk."""
+
+from __future__ import print_function, unicode_literals
+import heapq
+import pickle
+import tempfile
+
+
+class ExternalSort(object):
+
+    """Collect items, spilling sorted runs to temporary files.
+
+    Iterating merges the runs back in key order; items with equal keys come
+    out in the order they were added, as with sorted().  Items must be
+    picklable.
+
+    Attributes:
+        key Function: sort key, as for sorted().
+        run_size Int: number of items held in memory before spilling a run.
+        tmpdir String: directory for run files (defaults to the system's).
+    """
+
+    def __init__(self, key=None, run_size=100000, tmpdir=None):
+        self.key = key
+        self.run_size = run_size
+        self.tmpdir = tmpdir
+        self.buffer = []
+        self.runs = []
+
+    def add(self, item):
+        self.buffer.append(item)
+        if len(self.buffer) >= self.run_size:
+            self._spill()
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+    def _spill(self):
+        self.buffer.sort(key=self.key)
+        run = tempfile.TemporaryFile(dir=self.tmpdir)
+        for item in self.buffer:
+            pickle.dump(item, run, pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        self.runs.append(run)
+        self.buffer = []
+
+    @staticmethod
+    def _read_run(run):
+        while True:
+            try:
+                yield pickle.load(run)
+            except EOFError:
+                break
+
+    def __iter__(self):
+        """Yield every item in key order, then discard the runs."""
+        self.buffer.sort(key=self.key)
+        try:
+            if not self.runs:
+                for item in self.buffer:
+                    yield item
+            else:
+                # Oldest first, so items with equal keys keep their order.
+                runs = [self._read_run(r) for r in self.runs]
+                runs.append(self.buffer)
+                for item in heapq.merge(*runs, key=self.key):
+                    yield item
+        finally:
+            self.close()
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.buffer = []
@@ -0,0 +1,261 @@
+"""faidx-style index over a FASTA file or the ##FASTA section of a GFF3.
+
+Each sequence's length, byte offset and line layout are recorded in one
+pass, and bases are then sliced straight out of a memory map, so a region
+of a chromosome can be read without loading the chromosome.
+
+    index = FastaIndex.from_gff3('genome.gff3')
+    print(index.seq('Supercontig_1', 1001, 1500))
+"""
+
+from __future__ import print_function, unicode_literals
+import io
+import mmap
+import os
+
+FASTA_DIRECTIVE = b'##FASTA'
+
+
+class FastaIndexError(Exception):
+    pass
+
+
+def fasta_offset(path):
+    """Return the offset of a GFF3 file's ##FASTA line, or None."""
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, 'rb') as infile:
+        mm = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mm[:len(FASTA_DIRECTIVE)] == FASTA_DIRECTIVE:
+                return 0
+            i = mm.find(b'\n' + FASTA_DIRECTIVE)
+        finally:
+            mm.close()
+    return None if i < 0 else i + 1
+
+
+def plain_path(infile):
+    """Return the path of an uncompressed regular file opened by name, or
+    None for anything else (a pipe, stdin, a decompressing stream...)."""
+    raw = getattr(getattr(infile, 'buffer', infile), 'raw', None)
+    if not isinstance(raw, io.FileIO):
+        return None
+    path = raw.name
+    if isinstance(path, str) and os.path.isfile(path):
+        return path
+    return None
+
+
+class FastaEntry(object):
+
+    """Location of one sequence in the file, as in a .fai line.
+
+    Attributes:
+        name String: sequence ID (the header up to the first whitespace).
+        length Int: number of bases.
+        offset Int: byte offset of the first base.
+        linebases Int: bases per full line.
+        linewidth Int: bytes per full line, including the line ending.
+    """
+
+    __slots__ = ('name', 'length', 'offset', 'linebases', 'linewidth')
+
+    def __init__(self, name, length, offset, linebases, linewidth):
+        self.name = name
+        self.length = length
+        self.offset = offset
+        self.linebases = linebases
+        self.linewidth = linewidth
+
+    def byte(self, pos):
+        """Return the file offset of 0-based position pos."""
+        if not self.linebases:
+            return self.offset
+        line, col = divmod(pos, self.linebases)
+        return self.offset + line * self.linewidth + col
+
+    def format(self):
+        return '\t'.join((self.name, str(self.length), str(self.offset),
+                          str(self.linebases), str(self.linewidth)))
+
+
+class FastaSequence(object):
+
+    """A lazily read sequence yielded by GFF3Parser in ##FASTA mode.
+
+    Attributes:
+        index FastaIndex: index the sequence belongs to.
+        id String: sequence ID.
+    """
+
+    __slots__ = ('index', 'id')
+
+    def __init__(self, index, id):
+        self.index = index
+        self.id = id
+
+    def __reduce__(self):
+        return (FastaSequence, (self.index, self.id))
+
+    def __len__(self):
+        return self.index.entries[self.id].length
+
+    def seq(self, start=1, end=None):
+        return self.index.seq(self.id, start, end)
+
+    def format(self, width=60):
+        seq = self.seq()
+        lines = ['>' + self.id]
+        lines += [seq[i:i + width] for i in range(0, len(seq), width)]
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.format()
+
+
+class FastaIndex(object):
+
+    """Byte layout of every sequence in a FASTA file.
+
+    The file is mapped while the index is built, until close().  A closed
+    or unpickled index reads each sequence straight from the file by path,
+    leaving nothing open.
+
+    Attributes:
+        path String: the file.
+        offset Int: byte offset the sequences start from.
+        entries String FastaEntry Dict: entries by sequence ID, in file order.
+    """
+
+    def __init__(self, path, offset=0, entries=None):
+        self.path = path
+        self.offset = offset
+        self._file = None
+        self._mm = None
+        if entries is None:
+            self.entries = {}
+            self.build(offset)
+        else:
+            self.entries = entries
+
+    def __reduce__(self):
+        return (FastaIndex, (self.path, self.offset, self.entries))
+
+    @classmethod
+    def from_gff3(cls, path):
+        """Index the ##FASTA section of a GFF3 file."""
+        offset = fasta_offset(path)
+        if offset is None:
+            raise FastaIndexError("No ##FASTA section in %s" % path)
+        return cls(path, offset)
+
+    def _map(self):
+        """Return the memory map of the file, or None if there are no bytes
+        past offset."""
+        if self._mm is None and os.path.getsize(self.path) > self.offset:
+            self._file = open(self.path, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        return self._mm
+
+    def build(self, offset):
+        self.offset = offset
+        self.entries.clear()
+        mm = self._map()
+        if mm is None:
+            return
+        size = len(mm)
+        pos = offset
+        entry = None
+        short = False
+
+        while pos < size:
+            eol = mm.find(b'\n', pos)
+            if eol < 0:
+                eol = size
+            line = mm[pos:eol]
+            width = eol - pos + 1
+            if line.startswith(b'>'):
+                name = line[1:].split(None, 1)[0].decode('utf-8')
+                if name in self.entries:
+                    raise FastaIndexError("Duplicate sequence %s" % name)
+                entry = FastaEntry(name, 0, eol + 1, 0, 0)
+                self.entries[name] = entry
+                short = False
+            elif entry is not None:
+                bases = len(line.rstrip(b'\r'))
+                if not bases:
+                    # Only trailing blank lines may follow a short line.
+                    short = short or entry.length > 0
+                elif short:
+                    raise FastaIndexError(
+                        "Uneven line lengths in %s" % entry.name)
+                elif not entry.linebases:
+                    entry.linebases = bases
+                    entry.linewidth = width
+                elif (bases > entry.linebases or
+                      bases == entry.linebases and width != entry.linewidth
+                      and eol < size):
+                    raise FastaIndexError(
+                        "Uneven line lengths in %s" % entry.name)
+                elif bases < entry.linebases:
+                    # Only a sequence's last line may be short.
+                    short = True
+                entry.length += bases
+            elif line.strip() and not line.startswith(FASTA_DIRECTIVE):
+                raise FastaIndexError("Sequence before the first header")
+            pos = eol + 1
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def length(self, name):
+        return self.entries[name].length
+
+    def seq(self, name, start=1, end=None):
+        """Return bases start..end (1-based, inclusive) of a sequence."""
+        entry = self.entries[name]
+        if end is None or end > entry.length:
+            end = entry.length
+        start = max(start, 1)
+        if end < start:
+            return ''
+        data = self._read(entry.byte(start - 1), entry.byte(end - 1) + 1)
+        return data.replace(b'\n', b'').replace(b'\r', b'').decode('ascii')
+
+    def _read(self, start, stop):
+        if self._mm is not None:
+            return self._mm[start:stop]
+        with open(self.path, 'rb') as infile:
+            infile.seek(start)
+            return infile.read(stop - start)
+
+    def sequences(self):
+        """Yield a FastaSequence for each sequence, in file order."""
+        for name in self.entries:
+            yield FastaSequence(self, name)
+
+    def write_fai(self, outfile):
+        for entry in self.entries.values():
+            outfile.write(entry.format() + '\n')
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -7,13 +7,38 @@ from __future__ import print_function, unicode_literals
 from future.builtins import str
 import re
 import sys
+from sys import intern
 from functools import total_ordering
-from collections import OrderedDict
 
 
 R_WHITESPACE = re.compile(r'\s+')
 R_ATTR_TOKENS = re.compile(r';|#.*|"[^"]*"|[^";\s]+')
 
+# GFF2Feature uses __slots__ and pickles as its constructor arguments; the
+# seqids, sources, feature types and tags repeat on every row and are
+# interned.
+
+
+def parse_attributes(attributes):
+    """Decode a GFF2 attributes column into (attributes, trailing comment)."""
+    attr = {}
+    values = []
+    comment = None
+    for t in R_ATTR_TOKENS.findall(attributes):
+        if t == ';':
+            tag = values.pop(0)
+            attr[intern(tag)] = tuple(values)
+            values = []
+        elif t.startswith('#'):
+            comment = Comment(t.lstrip('#').lstrip())
+            break
+        else:
+            values.append(t)
+    if values:
+        tag = values.pop(0)
+        attr[intern(tag)] = tuple(values)
+    return attr, comment
+
 
 class Comment(object):
 
@@ -64,22 +89,45 @@ class GFF2Feature(object):
         phase String: .,0,1,2 required for all CDS features indicating # of
             bases to remove from the beginning of this region to reach the first
             base of the next codon.
-        attributes String List OrderedDict: attributes in tag/value format.
+        attributes String Tuple Dict: attributes in tag/value format, in file
+            order.  Parsed rows keep the raw attributes column until this is
+            first accessed.
+        comment Comment: trailing comment in the attributes column.
     """
 
+    __slots__ = ('seqid', 'source', 'feature', 'start', 'end', 'score',
+                 'strand', 'phase', '_attributes', 'comment')
+
     def __init__(self, seqid, source, feature, start, end, score, strand,
                  phase, attributes=None, comment=None):
         self.seqid = seqid
         self.source = source
         self.feature = feature
-        self.start = start
-        self.end = end
+        self.start = int(start)
+        self.end = int(end)
         self.score = score
         self.strand = strand
         self.phase = phase
-        self.attributes = attributes or OrderedDict()
+        self._attributes = attributes or None
         self.comment = comment
 
+    def __reduce__(self):
+        return (GFF2Feature, (self.seqid, self.source, self.feature,
+                              self.start, self.end, self.score, self.strand,
+                              self.phase, self._attributes, self.comment))
+
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            self._attributes = {}
+        elif isinstance(self._attributes, str):
+            self._attributes, _ = parse_attributes(self._attributes)
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, attributes):
+        self._attributes = attributes or None
+
     def is_within(self, other):
         return (self.seqid == other.seqid and
                 self.start >= other.start and
@@ -92,8 +140,8 @@ class GFF2Feature(object):
 
     def intersects(self, other):
         return (self.seqid == other.seqid and
-                other.start <= self.start <= other.end or
-                other.start <= self.end <= other.end)
+                self.start <= other.end and
+                other.start <= self.end)
 
     def __eq__(self, other):
         return (self.seqid == other.seqid and
@@ -109,13 +157,18 @@ class GFF2Feature(object):
             return self.end < other.end
 
     def format(self):
-        attributes = [' '.join((k, ' '.join(v))) for k, v in self.attributes.items()]
-        if self.comment:
-            attributes.append(str(self.comment))
-        attributes = ';'.join(attributes)
-        return '\t'.join((self.seqid, self.source, self.feature, self.start,
-                          self.end, self.score, self.strand, self.phase,
-                          attributes))
+        if isinstance(self._attributes, str):
+            # Untouched rows are written back exactly as they were read.
+            attributes = self._attributes
+        else:
+            items = self._attributes.items() if self._attributes else ()
+            attributes = [' '.join((k, ' '.join(v))) for k, v in items]
+            if self.comment:
+                attributes.append(str(self.comment))
+            attributes = ';'.join(attributes)
+        return '\t'.join((self.seqid, self.source, self.feature,
+                          str(self.start), str(self.end), self.score,
+                          self.strand, self.phase, attributes))
 
 
 class GFF2Parser(object):
@@ -149,28 +202,20 @@ class GFF2Parser(object):
     def parse_feature(self, line):
         columns = line.split('\t', 8)
         seqid, source, feature, start, end, score, strand, phase, _attr = columns
+        seqid = intern(seqid)
+        source = intern(source)
+        feature = intern(feature)
 
-        attributes, comment = self.parse_attributes(_attr)
+        if '#' in _attr:
+            # Split off the trailing comment now.
+            attributes, comment = self.parse_attributes(_attr)
+        else:
+            # Decoded if and when the attributes are used.
+            attributes, comment = _attr, None
 
         f = GFF2Feature(seqid, source, feature, start, end, score, strand,
                         phase, attributes, comment)
         return f
 
     def parse_attributes(self, attributes):
-        attr = OrderedDict()
-        values = []
-        comment = None
-        for t in R_ATTR_TOKENS.findall(attributes):
-            if t == ';':
-                tag = values.pop(0)
-                attr[tag] = values
-                values = []
-            elif t.startswith('#'):
-                comment = self.parse_comment(t)
-                break
-            else:
-                values.append(t)
-        if values:
-            tag = values.pop(0)
-            attr[tag] = values
-        return attr, comment
+        return parse_attributes(attributes)
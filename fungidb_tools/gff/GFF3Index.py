@@ -0,0 +1,168 @@
+"""Random access to feature subtrees in a GFF3 file by ID.
+
+The index records the byte offset of every feature line, keyed by ID, along
+with each feature's parents.  It is saved next to the GFF3 file and rebuilt
+whenever the file's size or modification time no longer match.
+
+    index = GFF3Index('genome.gff3')
+    gene = index.get('NCU00001')
+    print(gene.format())
+"""
+
+from __future__ import print_function, unicode_literals
+import os
+import re
+from collections import defaultdict
+from warnings import warn
+from .GFF3Parser import GFF3Parser, FeatureTiers
+
+SUFFIX = '.gfi'
+MAGIC = 'gff3index'
+
+R_ID = re.compile(br'(?:^|;)ID=([^;\r\n]*)')
+R_PARENT = re.compile(br'(?:^|;)Parent=([^;\r\n]*)')
+
+
+class GFF3Index(object):
+
+    """Byte offsets of the feature lines in a GFF3 file.
+
+    Attributes:
+        path String: the GFF3 file.
+        index_path String: the sidecar index file.
+        rows String Int List Dict: line offsets by feature ID.
+        children String List Dict: child IDs by parent ID.
+        anonymous String Int List Dict: offsets of lines without an ID, by
+            parent ID.
+    """
+
+    def __init__(self, path, index_path=None, rebuild=False):
+        self.path = path
+        self.index_path = index_path or path + SUFFIX
+        self.rows = defaultdict(list)
+        self.children = defaultdict(list)
+        self.anonymous = defaultdict(list)
+
+        if rebuild or not self.load():
+            self.build()
+            self.save()
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return '{}\t{}'.format(st.st_size, st.st_mtime_ns)
+
+    def build(self):
+        """Scan the GFF3 file for feature lines."""
+        self.rows.clear()
+        self.children.clear()
+        self.anonymous.clear()
+
+        offset = 0
+        with open(self.path, 'rb') as infile:
+            for line in infile:
+                here = offset
+                offset += len(line)
+                if line.startswith(b'#'):
+                    if line.startswith(b'##FASTA'):
+                        break
+                    continue
+                columns = line.split(b'\t', 8)
+                if len(columns) < 9:
+                    continue
+                attr = columns[8]
+
+                match = R_ID.search(attr)
+                id = match.group(1).decode('utf-8') if match else None
+                match = R_PARENT.search(attr)
+                parents = match.group(1).decode('utf-8').split(',') if match else ()
+
+                if id is not None:
+                    if id not in self.rows:
+                        for p in parents:
+                            self.children[p].append(id)
+                    self.rows[id].append(here)
+                else:
+                    for p in parents:
+                        self.anonymous[p].append(here)
+
+    def load(self):
+        """Read the sidecar; return False if it is missing or out of date."""
+        try:
+            with open(self.index_path, 'r') as idx:
+                header = idx.readline().rstrip('\n').split('\t', 1)
+                if header != [MAGIC, self._stamp()]:
+                    return False
+                for line in idx:
+                    kind, key, values = line.rstrip('\n').split('\t')
+                    values = values.split(',')
+                    if kind == 'R':
+                        self.rows[key] = [int(v) for v in values]
+                    elif kind == 'C':
+                        self.children[key] = values
+                    elif kind == 'A':
+                        self.anonymous[key] = [int(v) for v in values]
+        except (IOError, OSError, ValueError):
+            self.rows.clear()
+            self.children.clear()
+            self.anonymous.clear()
+            return False
+        return True
+
+    def save(self):
+        tmp = self.index_path + '~'
+        try:
+            with open(tmp, 'w') as idx:
+                idx.write('\t'.join((MAGIC, self._stamp())) + '\n')
+                for kind, table in (('R', self.rows), ('C', self.children),
+                                    ('A', self.anonymous)):
+                    for key, values in table.items():
+                        values = ','.join(str(v) for v in values)
+                        idx.write('\t'.join((kind, key, values)) + '\n')
+            os.rename(tmp, self.index_path)
+        except (IOError, OSError) as e:
+            warn("Could not save index {}: {}".format(self.index_path, e))
+
+    def __contains__(self, id):
+        return id in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def ids(self):
+        return list(self.rows)
+
+    def offsets(self, id):
+        """Return the sorted offsets of a feature and all its descendants."""
+        offsets = []
+        seen = set()
+        stack = [id]
+        while stack:
+            i = stack.pop()
+            if i in seen:
+                continue
+            seen.add(i)
+            offsets += self.rows.get(i, ())
+            offsets += self.anonymous.get(i, ())
+            stack.extend(self.children.get(i, ()))
+        return sorted(set(offsets))
+
+    def lines(self, id):
+        """Return the lines of a feature and all its descendants."""
+        if id not in self.rows:
+            raise KeyError(id)
+        lines = []
+        with open(self.path, 'rb') as infile:
+            for offset in self.offsets(id):
+                infile.seek(offset)
+                lines.append(infile.readline().decode('utf-8'))
+        return lines
+
+    def get(self, id, parser=None):
+        """Parse and return a feature with its descendants attached."""
+        parser = parser or GFF3Parser()
+        # The feature's own parents are outside the subtree, so attach rows
+        # directly instead of asking for finished top-level trees.
+        tiers = FeatureTiers()
+        for line in self.lines(id):
+            tiers.attach(parser.parse_feature(line.rstrip()))
+        return tiers.features[id]
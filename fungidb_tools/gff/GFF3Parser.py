@@ -4,17 +4,67 @@ Edward Liaw
 """
 
 from __future__ import print_function, unicode_literals
+import heapq
 import re
 import sys
+from sys import intern
 from functools import total_ordering
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, defaultdict, namedtuple
+from .ExternalSort import ExternalSort
+from .FastaIndex import FastaIndex, plain_path
 
 
 R_WHITESPACE = re.compile(r'\s+')
+R_ID = re.compile(r'(?:^|;)ID=([^;]*)')
+R_PARENT = re.compile(r'(?:^|;)Parent=([^;]*)')
 
 GFF3Row = namedtuple('GFF3Row', ['seqid', 'source', 'type', 'start', 'end',
                                  'score', 'strand', 'phase', 'attr'])
 
+# Whole files of rows are held at once, so rows are kept small: Region and
+# GFF3Feature use __slots__ and pickle as their constructor arguments, and
+# the seqids, sources, types, tags and parent ids that repeat from row to
+# row are interned.
+
+
+class ParseError(Exception):
+    pass
+
+
+def parse_attributes(attributes):
+    """Decode a GFF3 attributes column into a dict of value tuples."""
+    attr = [a.split('=', 1) for a in attributes.split(';') if a]
+    return dict((intern(k), tuple(v.split(','))) for k, v in attr)
+
+
+def parse_ids(attributes):
+    """Pull only the ID and Parent(s) out of a GFF3 attributes column."""
+    match = R_ID.search(attributes)
+    id = match.group(1) if match else None
+    match = R_PARENT.search(attributes)
+    if match:
+        parents = tuple(intern(p) for p in match.group(1).split(','))
+    else:
+        parents = ()
+    return id, parents
+
+
+def format_ids(id, parents):
+    """Return the attributes column of a row with only an ID and Parent(s)."""
+    attributes = []
+    if id:
+        attributes.append('ID=' + id)
+    if parents:
+        attributes.append('Parent=' + ','.join(parents))
+    return ';'.join(attributes)
+
+
+def _region_attributes(attributes):
+    attr = parse_attributes(attributes)
+    attr.pop('ID', None)
+    attr.pop('Parent', None)
+    return attr
+
 
 class Comment(object):
 
@@ -67,18 +117,54 @@ class Region(object):
         phase String: .,0,1,2 required for all CDS features indicating # of
             bases to remove from the beginning of this region to reach the first
             base of the next codon.
-        attributes String List OrderedDict: attributes in tag/value format.
+        attributes String Tuple Dict: attributes in tag/value format, in
+            file order, excluding ID and Parent.  Parsed rows keep the raw
+            attributes column until this is first accessed.
     """
 
+    __slots__ = ('seqid', 'start', 'end', 'score', 'strand', 'phase',
+                 '_attributes')
+
     def __init__(self, seqid, start, end, score='.', strand='.', phase='.',
                  attributes=None):
         self.seqid = seqid
-        self.start = start
-        self.end = end
+        self.start = int(start)
+        self.end = int(end)
         self.score = score
         self.strand = strand
         self.phase = phase
-        self.attributes = attributes or OrderedDict()
+        self._attributes = attributes or None
+
+    def __reduce__(self):
+        return (Region, (self.seqid, self.start, self.end, self.score,
+                         self.strand, self.phase, self._attributes))
+
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            self._attributes = {}
+        elif isinstance(self._attributes, str):
+            self._attributes = _region_attributes(self._attributes)
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, attributes):
+        self._attributes = attributes or None
+
+    @property
+    def raw_attributes(self):
+        """The attributes column as read, if the attributes were never used."""
+        if isinstance(self._attributes, str):
+            return self._attributes
+        return None
+
+    def iter_attributes(self):
+        """Iterate over (tag, values) without storing a decoded mapping."""
+        if not self._attributes:
+            return iter(())
+        elif isinstance(self._attributes, str):
+            return iter(_region_attributes(self._attributes).items())
+        return iter(self._attributes.items())
 
     def is_within(self, other):
         return (self.seqid == other.seqid and
@@ -92,8 +178,8 @@ class Region(object):
 
     def intersects(self, other):
         return (self.seqid == other.seqid and
-                other.start <= self.start <= other.end or
-                other.start <= self.end <= other.end)
+                self.start <= other.end and
+                other.start <= self.end)
 
     def __eq__(self, other):
         return (self.seqid == other.seqid and
@@ -118,20 +204,38 @@ class GFF3Feature(object):
         source String: source identifier.
         soterm String: type of feature.
         id String: attribute identifying this feature.
-        parents GFF3Feature Set: parent feature(s).
-        regions Region List: region(s) this feature occupies.
-        children GFF3Feature Set: children feature(s).
+        parents String Tuple: ID(s) of parent feature(s).
+        regions Region Tuple: region(s) this feature occupies.
+        children GFF3Feature List: children feature(s); an empty tuple until
+            the first child is added.
     """
 
+    __slots__ = ('seqid', 'source', 'soterm', 'id', 'parents', 'regions',
+                 'children')
+
     def __init__(self, seqid, source, soterm, id,
                  parents=None, regions=None, children=None):
         self.seqid = seqid
         self.source = source
         self.soterm = soterm
         self.id = id
-        self.parents = set(parents) if parents else set()
-        self.regions = regions or []
-        self.children = set(children) if children else set()
+        self.parents = tuple(parents) if parents else ()
+        self.regions = tuple(regions) if regions else ()
+        self.children = list(children) if children else ()
+
+    def __reduce__(self):
+        return (GFF3Feature, (self.seqid, self.source, self.soterm, self.id,
+                              self.parents, self.regions, self.children))
+
+    def add_parent(self, parent):
+        if parent not in self.parents:
+            self.parents += (parent,)
+
+    def add_child(self, child):
+        if not self.children:
+            self.children = [child]
+        elif child not in self.children:
+            self.children.append(child)
 
     @classmethod
     def from_row(cls, row):
@@ -142,14 +246,16 @@ class GFF3Feature(object):
 
         if _id is not None:
             assert len(_id) == 1, "Illegal character ',' in ID"
-            id = _id.pop()
+            id = _id[0]
         else:
             #assert parents is not None, "No ID or Parents attribute"
             id = None
+        if parents is not None:
+            parents = tuple(intern(p) for p in parents)
 
-        regions = [Region(row.seqid, row.start, row.end, row.score, row.strand,
-                          row.phase, row.attr)]
-        return cls(row.seqid, row.source, row.soterm, id, parents, row.regions)
+        regions = (Region(row.seqid, row.start, row.end, row.score, row.strand,
+                          row.phase, row.attr),)
+        return cls(row.seqid, row.source, row.type, id, parents, regions)
 
     def to_rows(self, split_parents=False):
         outstr = []
@@ -161,11 +267,16 @@ class GFF3Feature(object):
             a.append(("Parent", self.parents))
 
         for r in sorted(self.regions):
-            attributes = a + list(r.attributes.items())
-            attributes = ['='.join((k, ','.join(v))) for k, v in attributes]
-            attributes = ';'.join(attributes)
-            row = '\t'.join((r.seqid, self.source, self.soterm, r.start, r.end,
-                             r.score, r.strand, r.phase, attributes))
+            attributes = r.raw_attributes
+            # Untouched rows are written back exactly as they were read.
+            if attributes is None or parse_ids(attributes) != (self.id,
+                                                               self.parents):
+                attributes = a + list(r.iter_attributes())
+                attributes = ['='.join((k, ','.join(v))) for k, v in attributes]
+                attributes = ';'.join(attributes)
+            row = '\t'.join((r.seqid, self.source, self.soterm, str(r.start),
+                             str(r.end), r.score, r.strand, r.phase,
+                             attributes))
             outstr.append(row)
 
         for c in sorted(self.children):
@@ -173,6 +284,9 @@ class GFF3Feature(object):
 
         return '\n'.join(outstr)
 
+    def format(self):
+        return self.to_rows()
+
     def __str__(self):
         return self.format()
 
@@ -180,10 +294,248 @@ class GFF3Feature(object):
         return min(self.regions) < min(other.regions)
 
 
+class FeatureTiers(object):
+
+    """Attach GFF3 features to their parents as they arrive, in any order.
+
+    Top-level features are released by flush() or close().  In stream mode,
+    every tree on a contig is released once the seqid changes.  If the input
+    is also declared sorted by start, a tree is released as soon as a row
+    starts past its end, whatever trees that started before it are still
+    open (such as a row spanning the whole contig).  A later row that names
+    a released feature (such as the next row of a multi-row match) raises
+    ParseError rather than starting a second tree.  When more than
+    max_features are held on input not declared sorted, the contig's
+    features are spilled to disk and replayed in sorted order once the
+    contig is done.  Sorted input, like the replay itself, is not spilled:
+    it would only be read back in the same order, and holds no more than
+    the trees overlapping the current row.
+
+    Attributes:
+        stream Bool: release trees as soon as they are known to be finished.
+        sorted Bool: rows on each contig are sorted by start.
+        max_features Int: number of features to hold before spilling to disk.
+        tmpdir String: directory for spill files.
+        features GFF3Feature Dict: features held by ID.
+        roots Int GFF3Feature Dict: top-level features by arrival number,
+            in input order.
+        ends (Int, Int) List: heap of (end, arrival number) of the roots,
+            for sorted input; an end may be stale, but never too large.
+        pending GFF3Feature List Dict: children waiting on a parent, keyed by
+            the missing parent's ID.
+        released String Set: IDs of the trees released early on this contig.
+        extents String Int Dict: last end of each top-level ID, for features
+            whose later rows may not have been read yet.
+        size Int: number of features held.
+        peak Int: most features held at once.
+    """
+
+    def __init__(self, stream=False, max_features=None, tmpdir=None,
+                 sorted=False, extents=None):
+        self.stream = stream
+        self.sorted = sorted
+        self.max_features = max_features
+        self.tmpdir = tmpdir
+        self.features = {}
+        self.roots = OrderedDict()
+        self.ends = []
+        self.arrivals = 0
+        self.pending = defaultdict(list)
+        self.released = set()
+        self.extents = extents if extents is not None else {}
+        self.size = 0
+        self.peak = 0
+        self.spill = None
+        self.seqid = None
+
+    def add(self, feat):
+        """Place a feature and yield any trees it proves finished."""
+        if self.stream:
+            if feat.seqid != self.seqid:
+                for f in self.flush():
+                    yield f
+                self.seqid = feat.seqid
+                self.released.clear()
+
+            if self.spill is not None:
+                self.spill.add(feat)
+                self.extend(feat)
+                return
+            if self.sorted:
+                for f in self.pop_closed(feat.regions[0].start):
+                    yield f
+
+        self.attach(feat)
+
+        if (self.stream and not self.sorted and
+                self.max_features is not None and
+                self.size > self.max_features):
+            self.spill_features()
+
+    def attach(self, feat):
+        if self.released and (feat.id in self.released or
+                              any(p in self.released for p in feat.parents)):
+            raise ParseError(
+                "%s %s at %s:%d belongs to a tree released before this row; "
+                "parse without sorted" % (feat.soterm, feat.id or '',
+                                          feat.seqid, feat.regions[0].start))
+        # Add to the features or concatenate multi-line features as one
+        # feature.
+        if feat.id is not None:
+            try:
+                f = self.features[feat.id]
+            except KeyError:
+                self.features[feat.id] = feat
+                # Adopt any children that arrived before this feature.
+                for child in self.pending.pop(feat.id, ()):
+                    feat.add_child(child)
+            else:
+                f.regions += feat.regions
+                return
+        self.size += 1
+        self.peak = max(self.peak, self.size)
+
+        if not feat.parents:
+            self.arrivals += 1
+            self.roots[self.arrivals] = feat
+            if self.sorted:
+                heapq.heappush(self.ends, (self.end(feat), self.arrivals))
+        # Look for parents or wait for them to show up.
+        for p in feat.parents:
+            try:
+                self.features[p].add_child(feat)
+            except KeyError:
+                self.pending[p].append(feat)
+
+    def pop_closed(self, start):
+        """Release the trees that end before start, in input order."""
+        closed = []
+        while self.ends and self.ends[0][0] < start:
+            _, n = heapq.heappop(self.ends)
+            if n not in self.roots:
+                continue
+            end = self.end(self.roots[n])
+            if end < start:
+                closed.append(n)
+            else:
+                # A later row of the feature reached further.
+                heapq.heappush(self.ends, (end, n))
+        for n in sorted(closed):
+            yield self.pop_root(n, remember=True)
+
+    def end(self, root):
+        end = max(r.end for r in root.regions)
+        return max(end, self.extents.get(root.id, end))
+
+    def extend(self, feat):
+        """Record the end of a top-level feature's row."""
+        if feat.id is not None and not feat.parents:
+            end = max(r.end for r in feat.regions)
+            self.extents[feat.id] = max(end, self.extents.get(feat.id, end))
+
+    def pop_root(self, n=None, remember=False):
+        if n is None:
+            n = next(iter(self.roots))
+        root = self.roots.pop(n)
+        # Forget the whole tree so later rows can't attach to it.
+        stack = [root]
+        seen = set()
+        while stack:
+            f = stack.pop()
+            if id(f) in seen:
+                continue
+            seen.add(id(f))
+            if f.id is not None and self.features.get(f.id) is f:
+                del self.features[f.id]
+                if remember:
+                    self.released.add(f.id)
+            self.size -= 1
+            stack.extend(f.children)
+        return root
+
+    def flush(self):
+        """Release every top-level tree, keeping children still unresolved."""
+        for f in self.replay_spill():
+            yield f
+        while self.roots:
+            yield self.pop_root()
+        del self.ends[:]
+
+    def close(self):
+        """Release every top-level tree; all parents must have been seen."""
+        for f in self.flush():
+            yield f
+        if self.pending:
+            orphans = set(f for fs in self.pending.values() for f in fs)
+            sys.stderr.write("Wasn't able to find parents for:\n")
+            sys.stderr.write('\n'.join([f.format() for f in orphans]))
+            raise ParseError("Missing parents: %s" %
+                             ', '.join(sorted(self.pending)))
+        self.features.clear()
+        self.released.clear()
+        self.extents.clear()
+        self.size = 0
+
+    def held(self):
+        """Return every feature held, whether attached or pending."""
+        held = OrderedDict()
+        stack = list(self.roots.values()) + list(self.features.values())
+        stack += [f for fs in self.pending.values() for f in fs]
+        while stack:
+            f = stack.pop()
+            if id(f) not in held:
+                held[id(f)] = f
+                stack.extend(f.children)
+        return held.values()
+
+    def spill_features(self):
+        self.spill = ExternalSort(key=_spill_key, run_size=self.max_features,
+                                  tmpdir=self.tmpdir)
+        for f in self.held():
+            # Children are rebuilt on replay from the Parent attributes.
+            self.spill.add(GFF3Feature(f.seqid, f.source, f.soterm, f.id,
+                                       f.parents, f.regions))
+            self.extend(f)
+        self.features.clear()
+        self.roots.clear()
+        del self.ends[:]
+        self.pending.clear()
+        self.size = 0
+
+    def replay_spill(self):
+        """Re-tier spilled features in sorted order, releasing finished trees."""
+        if self.spill is None:
+            return
+        spill, self.spill = self.spill, None
+        # Every row of the contig is in the spill, so the extents are final
+        # and multi-row features are held until their last row.
+        replay = FeatureTiers(stream=True, sorted=True, extents=self.extents)
+        for feat in spill:
+            for f in replay.add(feat):
+                yield f
+        for f in replay.flush():
+            yield f
+        # Unresolved children carry over to the rest of the file.
+        self.features = replay.features
+        self.pending = replay.pending
+        self.size = replay.size
+        self.peak = max(self.peak, replay.peak)
+        self.extents = {}
+
+
+def _spill_key(feat):
+    return feat.seqid, min(r.start for r in feat.regions)
+
+
 class GFF3Parser(object):
-    def __init__(self, fasta=False, comments=True):
+    def __init__(self, fasta=False, comments=True, stream=False,
+                 max_features=None, tmpdir=None, sorted=False):
         self.fasta = fasta
         self.comments = comments
+        self.stream = stream
+        self.sorted = sorted
+        self.max_features = max_features
+        self.tmpdir = tmpdir
 
     def parse_flat(self, infile):
         for i, line in enumerate(infile):
@@ -209,56 +561,22 @@ class GFF3Parser(object):
                     raise e
 
     def parse(self, infile):
-        features = OrderedDict()
-        buffer = set()
-
-        def return_parents():
-            if buffer:
-                sys.stdout.write("Wasn't able to find parents for:\n")
-                sys.stdout.write('\n'.join([f.format() for f in buffer]))
-                raise
-            for f in features.values():
-                if not f.parents:
-                    yield f
-            features.clear()
-
-        def tier_feature(feat):
-            # Add to list of features or concatenate multi-line features as one
-            # feature.
-            try:
-                f = features[feat.id]
-            except KeyError:
-                if feat.id is not None:
-                    features[feat.id] = feat
-            else:
-                f.regions += feat.regions
-                feat = f
-
-            # Look for children in the buffer.
-            for f in list(buffer):
-                try:
-                    for p in f.parents:
-                        features[p].children.add(f)
-                except KeyError:
-                    pass
-                else:
-                    buffer.remove(f)
+        """Yield top-level features with their children attached.
 
-            # Look for parents or send to the buffer.
-            for p in feat.parents:
-                try:
-                    features[p].children.add(feat)
-                except KeyError:
-                    buffer.add(feat)
+        Trees are released at ### directives and at the end of the file, or
+        earlier in stream mode (see FeatureTiers).
+        """
+        tiers = FeatureTiers(self.stream, self.max_features, self.tmpdir,
+                             self.sorted)
 
         for i, line in enumerate(infile):
             line = line.rstrip()
 
             if line.startswith('###'):
-                for f in return_parents():
+                for f in tiers.close():
                     yield f
             elif line.startswith('##FASTA'):
-                for f in return_parents():
+                for f in tiers.close():
                     yield f
                 if self.fasta:
                     for f in self.parse_fasta(infile):
@@ -276,9 +594,10 @@ class GFF3Parser(object):
                     sys.stderr.write("Failed on line %d:\n%s\n" % (i, line))
                     raise e
                 else:
-                    tier_feature(feat)
+                    for f in tiers.add(feat):
+                        yield f
         else:
-            for f in return_parents():
+            for f in tiers.close():
                 yield f
 
     def parse_directive(self, line):
@@ -295,18 +614,40 @@ class GFF3Parser(object):
         assert len(columns) == 9, "Line does not have 9 columns:\n%s" % line
 
         seqid, source, soterm, start, end, score, strand, phase, _attr = columns
+        seqid = intern(seqid)
+        source = intern(source)
+        soterm = intern(soterm)
 
-        attributes = self.parse_attributes(_attr)
+        # Only ID and Parent are needed to build the hierarchy; the rest of
+        # the column is decoded if and when it is used.
+        id, parents = parse_ids(_attr)
+        assert id is None or ',' not in id, "Illegal character ',' in ID"
+        if _attr == format_ids(id, parents):
+            # to_rows writes the same column back from id and parents.
+            _attr = None
 
-        f = GFF3Feature.from_row(GFF3Row(seqid, source, soterm, start, end,
-                                         score, strand, phase, attributes))
-        return f
+        region = Region(seqid, start, end, score, strand, phase, _attr)
+        return GFF3Feature(seqid, source, soterm, id, parents, (region,))
 
     def parse_attributes(self, attributes):
-        attr = [a.split('=', 1) for a in attributes.split(';')]
-        attr = OrderedDict((k, v.split(',')) for k, v in attr)
-        return attr
+        return parse_attributes(attributes)
 
     def parse_fasta(self, infile):
-        from Bio import SeqIO
-        return SeqIO.parse(infile)
+        """Yield the sequences after ##FASTA.
+
+        From an uncompressed regular file these are FastaSequences read
+        lazily through a FastaIndex, which is closed again once they have all
+        been yielded; from any other stream, Biopython SeqRecords.
+        """
+        path = plain_path(infile)
+        if path is None:
+            from Bio import SeqIO
+            for record in SeqIO.parse(infile, 'fasta'):
+                yield record
+            return
+        index = FastaIndex.from_gff3(path)
+        try:
+            for sequence in index.sequences():
+                yield sequence
+        finally:
+            index.close()
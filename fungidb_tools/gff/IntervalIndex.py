@@ -0,0 +1,237 @@
+"""Interval index over parsed GFF features.
+
+Each contig's features are kept in a nested containment list (NCList): a
+list sorted by start in which no interval contains another, with every
+contained interval pushed down into a sublist of its container.  Starts and
+ends then both increase along each list, so overlap queries are a bisection
+plus a walk over the hits, O(log n + k).
+
+    from fungidb_tools.gff import GFF3Parser as gp
+    from fungidb_tools.gff.IntervalIndex import IntervalIndex
+
+    genes = [f for f in gp.GFF3Parser().parse(infile)
+             if isinstance(f, gp.GFF3Feature)]
+    index = IntervalIndex(genes)
+    for gene, hits in index.find_overlaps(genes):
+        ...
+"""
+
+from __future__ import print_function, unicode_literals
+from bisect import bisect_left, bisect_right
+
+
+def span(feature):
+    """Return (seqid, start, end) for any of the parsers' feature classes."""
+    regions = getattr(feature, 'regions', None)
+    if regions:
+        # GFF3Feature: the span of all of its regions.
+        return (feature.seqid, min(r.start for r in regions),
+                max(r.end for r in regions))
+    pos = getattr(feature, 'pos', None)
+    if pos:
+        # isf.parse_gff.Feature: (start, end) pairs.
+        return (feature.seqid, min(int(s) for s, e in pos),
+                max(int(e) for s, e in pos))
+    return feature.seqid, int(feature.start), int(feature.end)
+
+
+class _NCList(object):
+
+    """One level of a nested containment list.
+
+    Attributes:
+        starts Int List: interval starts, ascending.
+        ends Int List: interval ends, ascending.
+        items List: the indexed objects.
+        sublists _NCList List: intervals contained in each item, or None.
+    """
+
+    __slots__ = ('starts', 'ends', 'items', 'sublists')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.items = []
+        self.sublists = []
+
+    def append(self, start, end, item):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.items.append(item)
+        self.sublists.append(None)
+
+    def overlapping(self, start, end):
+        """Yield (start, end, item) for every interval overlapping the range."""
+        i = bisect_left(self.ends, start)
+        starts = self.starts
+        while i < len(starts) and starts[i] <= end:
+            yield starts[i], self.ends[i], self.items[i]
+            sub = self.sublists[i]
+            if sub is not None:
+                for hit in sub.overlapping(start, end):
+                    yield hit
+            i += 1
+
+    def containing(self, start, end):
+        """Yield (start, end, item) for every interval covering the range."""
+        i = bisect_left(self.ends, end)
+        starts = self.starts
+        while i < len(starts) and starts[i] <= start:
+            yield starts[i], self.ends[i], self.items[i]
+            # Only a container can have nested intervals that also contain
+            # the range.
+            sub = self.sublists[i]
+            if sub is not None:
+                for hit in sub.containing(start, end):
+                    yield hit
+            i += 1
+
+    def walk(self):
+        for i, item in enumerate(self.items):
+            yield self.starts[i], self.ends[i], item
+            sub = self.sublists[i]
+            if sub is not None:
+                for hit in sub.walk():
+                    yield hit
+
+    def contained(self, start, end):
+        """Yield (start, end, item) for every interval inside the range."""
+        i = bisect_left(self.ends, start)
+        starts = self.starts
+        while i < len(starts) and starts[i] <= end:
+            sub = self.sublists[i]
+            if starts[i] >= start and self.ends[i] <= end:
+                # Everything nested inside a contained interval is too.
+                yield starts[i], self.ends[i], self.items[i]
+                if sub is not None:
+                    for hit in sub.walk():
+                        yield hit
+            elif sub is not None:
+                for hit in sub.contained(start, end):
+                    yield hit
+            i += 1
+
+
+class IntervalIndex(object):
+
+    """Overlap, containment and nearest-neighbour queries over features.
+
+    Coordinates are 1-based and inclusive, as in GFF.
+
+    Attributes:
+        key Function: returns (seqid, start, end) for an item.
+    """
+
+    def __init__(self, items=(), key=span):
+        self.key = key
+        self._lists = {}
+        # Flat per-contig views for nearest-neighbour lookups.
+        self._by_start = {}
+        self._by_end = {}
+        self._build(items)
+
+    def _build(self, items):
+        contigs = {}
+        for item in items:
+            seqid, start, end = self.key(item)
+            contigs.setdefault(seqid, []).append((start, end, item))
+
+        for seqid, intervals in contigs.items():
+            # Containers sort ahead of the intervals they contain.
+            intervals.sort(key=lambda iv: (iv[0], -iv[1]))
+            top = _NCList()
+            stack = []
+            for start, end, item in intervals:
+                while stack and stack[-1][1] < end:
+                    stack.pop()
+                if stack:
+                    parent, _, i = stack[-1]
+                    if parent.sublists[i] is None:
+                        parent.sublists[i] = _NCList()
+                    target = parent.sublists[i]
+                else:
+                    target = top
+                target.append(start, end, item)
+                stack.append((target, end, len(target.items) - 1))
+            self._lists[seqid] = top
+
+            self._by_start[seqid] = ([iv[0] for iv in intervals],
+                                     [iv[2] for iv in intervals])
+            by_end = sorted(intervals, key=lambda iv: iv[1])
+            self._by_end[seqid] = ([iv[1] for iv in by_end],
+                                   [iv[2] for iv in by_end])
+
+    def __len__(self):
+        return sum(len(starts) for starts, _ in self._by_start.values())
+
+    def seqids(self):
+        return list(self._lists)
+
+    def overlapping(self, seqid, start, end):
+        """Return the items that share at least one base with the range."""
+        try:
+            nc = self._lists[seqid]
+        except KeyError:
+            return []
+        return [item for _, _, item in nc.overlapping(start, end)]
+
+    def containing(self, seqid, start, end):
+        """Return the items whose span covers the whole range."""
+        try:
+            nc = self._lists[seqid]
+        except KeyError:
+            return []
+        return [item for _, _, item in nc.containing(start, end)]
+
+    def contained(self, seqid, start, end):
+        """Return the items that lie entirely within the range."""
+        try:
+            nc = self._lists[seqid]
+        except KeyError:
+            return []
+        return [item for _, _, item in nc.contained(start, end)]
+
+    def nearest(self, seqid, start, end):
+        """Return the items closest to the range.
+
+        Overlapping items are returned when there are any; otherwise the
+        nearest upstream and/or downstream item (both on a tie).
+        """
+        hits = self.overlapping(seqid, start, end)
+        if hits or seqid not in self._lists:
+            return hits
+
+        candidates = []
+        ends, items = self._by_end[seqid]
+        i = bisect_left(ends, start) - 1
+        if i >= 0:
+            candidates.append((start - ends[i], items[i]))
+        starts, items = self._by_start[seqid]
+        j = bisect_right(starts, end)
+        if j < len(starts):
+            candidates.append((starts[j] - end, items[j]))
+        if not candidates:
+            return []
+        best = min(d for d, _ in candidates)
+        return [item for d, item in candidates if d == best]
+
+    def find_overlaps(self, items, key=None):
+        """Yield (item, overlapping indexed items) for each query item.
+
+        An item that is itself in the index is not reported as overlapping
+        itself.
+        """
+        key = key or self.key
+        for item in items:
+            seqid, start, end = key(item)
+            yield item, [hit for hit in self.overlapping(seqid, start, end)
+                         if hit is not item]
+
+    def find_uncontained(self, items, key=None):
+        """Yield each query item that no indexed item fully covers."""
+        key = key or self.key
+        for item in items:
+            seqid, start, end = key(item)
+            if not any(hit is not item
+                       for hit in self.containing(seqid, start, end)):
+                yield item
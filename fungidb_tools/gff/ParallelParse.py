@@ -0,0 +1,294 @@
+"""Parse a GFF/GTF file in parallel chunks.
+
+The file is cut into byte ranges that end where the seqid changes or after
+a ### directive (and any comments following it), so no feature hierarchy
+straddles two ranges.  Each range is parsed in a worker process by the same
+parser method used serially, and the results are yielded back in file
+order.
+
+Parents are assumed to be on the same contig as their children, and each
+contig's rows to be together.  For the methods that nest features, the
+ranges are first scanned for a seqid that comes back after its rows ended
+(rows interleaved across contigs); such a file is parsed serially instead,
+with a warning.
+
+    from fungidb_tools.gff import GFF3Parser as gp
+    from fungidb_tools.gff.ParallelParse import parse_parallel
+
+    for feat in parse_parallel(gp.GFF3Parser(), 'genome.gff3', jobs=8):
+        ...
+
+Works with GFF3Parser.parse/parse_flat, GFF2Parser.parse and
+isf.parse_gff.GFFParser.parse/parse_flat/parse_3level_sorted.  Pass
+commentfile for the parse_gff methods; text they write to it is replayed in
+order as the results are yielded.
+
+A worker releases its range's last trees at the end of the range, where the
+serial method would only release them at the next range's first row, or
+not until a ### line or the end of the file when it holds every tree
+(GFF3Parser.parse without stream, parse_3level with stream=False).  Workers
+mark those points, and the trees are held back to them, so the output
+matches the serial method item for item.
+"""
+
+from __future__ import print_function, unicode_literals
+import io
+import os
+from warnings import warn
+from . import ParallelRanges
+from .FastaIndex import FASTA_DIRECTIVE, fasta_offset
+from .GFF3Parser import Comment, Directive, GFF3Parser
+from .ParallelRanges import RANGES_PER_JOB, ordered_map
+
+
+class _Text(str):
+
+    """Text a parser wrote to its comment file, as opposed to a result."""
+
+    __slots__ = ()
+
+
+class _Recorder(object):
+
+    """Stand-in comment file that keeps writes in line with the results."""
+
+    def __init__(self, results):
+        self.results = results
+
+    def write(self, text):
+        self.results.append(_Text(text))
+
+    def writelines(self, lines):
+        self.results.extend(_Text(line) for line in lines)
+
+
+class _Release(object):
+
+    """Marks where the serial method would release the trees it holds."""
+
+    __slots__ = ()
+
+
+class _End(object):
+
+    """Marks the end of a range: what follows, the serial method would
+    only release at the next _Release."""
+
+    __slots__ = ()
+
+
+def _marking_releases(lines, results, separators):
+    """Yield lines, recording in results where the serial method releases
+    the trees it holds.
+
+    With separators, that is after each ### line (GFF3Parser.parse holding
+    every tree).  Otherwise it is at the first row, which is where a stream
+    parse releases the previous range's contig, and the end of the range.
+    """
+    first = not separators
+    for line in lines:
+        if first and line.strip() and not line.startswith('#'):
+            results.append(_Release())
+            first = False
+        yield line
+        if separators and line.startswith('###'):
+            results.append(_Release())
+    if not separators:
+        results.append(_End())
+
+
+def _holds_trees(parser, method, kwargs):
+    """Whether the serial method holds every tree until the end of the file,
+    rather than releasing a contig's trees once the seqid changes."""
+    if method == 'parse_3level':
+        return not kwargs.get('stream', True)
+    return method == 'parse' and getattr(parser, 'stream', True) is False
+
+
+def _nests(parser, method):
+    """Whether the method attaches children to parents across rows."""
+    return (method.startswith('parse_3level') or
+            method == 'parse' and isinstance(parser, GFF3Parser))
+
+
+def _seqid(line):
+    if line.startswith(b'#') or not line.strip():
+        return None
+    return line.split(b'\t', 1)[0]
+
+
+def _next_cut(infile, target, fasta):
+    """Return the offset of the first seqid change or the end of the first
+    ### directive after target, or None if there is none before fasta."""
+    infile.seek(target)
+    infile.readline()  # Finish the partial line.
+    offset = infile.tell()
+    last = None
+    while offset < fasta:
+        line = infile.readline()
+        if not line:
+            return None
+        if line.startswith(b'###'):
+            # Comments and directives up to the next row stay in this
+            # range, as they do at a seqid change: a stream parse reads
+            # them before releasing the range's trees.
+            offset += len(line)
+            while offset < fasta:
+                line = infile.readline()
+                if not line or _seqid(line) is not None:
+                    break
+                offset += len(line)
+            return offset
+        seqid = _seqid(line)
+        if seqid is not None:
+            if last is not None and seqid != last:
+                return offset
+            last = seqid
+        offset += len(line)
+    return None
+
+
+def split_ranges(path, chunks):
+    """Return (start, end) byte ranges that break on seqid or ### lines."""
+    size = os.path.getsize(path)
+    fasta = fasta_offset(path)
+    if fasta is None:
+        fasta = size
+    ranges = []
+    if fasta:
+        ranges = ParallelRanges.split_ranges(
+            path, chunks, lambda infile, target: _next_cut(infile, target,
+                                                           fasta), fasta)
+    if fasta < size:
+        # Everything from ##FASTA on goes to one last range.
+        ranges.append((fasta, size))
+    return ranges or [(0, size)]
+
+
+def _seqid_runs(task):
+    """Return the seqids of a range's rows, once per run of the same one."""
+    path, start, end = task
+    runs = []
+    with open(path, 'rb') as infile:
+        infile.seek(start)
+        offset = start
+        while offset < end:
+            line = infile.readline()
+            if not line or line.startswith(FASTA_DIRECTIVE):
+                break
+            offset += len(line)
+            seqid = _seqid(line)
+            if seqid is not None and (not runs or runs[-1] != seqid):
+                runs.append(seqid)
+    return runs
+
+
+def _returning_seqid(path, ranges, jobs):
+    """Return a seqid whose rows start again after another seqid's, or None
+    if each seqid's rows are together."""
+    tasks = [(path, start, end) for start, end in ranges]
+    seen = set()
+    last = None
+    for runs in ordered_map(_seqid_runs, tasks, jobs):
+        for seqid in runs:
+            if seqid == last:
+                continue
+            if seqid in seen:
+                return seqid.decode('utf-8')
+            seen.add(seqid)
+            last = seqid
+    return None
+
+
+def _parse_serial(parser, method, path, commentfile, kwargs):
+    if commentfile is not None:
+        kwargs = dict(kwargs, commentfile=commentfile)
+    with io.open(path, encoding='utf-8') as infile:
+        for item in getattr(parser, method)(infile, **kwargs):
+            yield item
+
+
+def _parse_range(task):
+    parser, method, path, start, end, comments, kwargs = task
+    with open(path, 'rb') as infile:
+        infile.seek(start)
+        fasta = infile.read(len(FASTA_DIRECTIVE)) == FASTA_DIRECTIVE
+        if not fasta:
+            infile.seek(start)
+            text = infile.read(end - start).decode('utf-8')
+    if fasta:
+        # Read the ##FASTA section from the file itself, so it goes through
+        # the index as it does serially.
+        infile = io.open(path, encoding='utf-8')
+        infile.seek(start)
+    else:
+        infile = io.StringIO(text)
+
+    results = []
+    lines = infile
+    if not fasta:
+        if not _holds_trees(parser, method, kwargs):
+            lines = _marking_releases(infile, results, separators=False)
+        elif method == 'parse':
+            # GFF3Parser.parse also releases every tree at a ### line.
+            lines = _marking_releases(infile, results, separators=True)
+    if comments:
+        kwargs = dict(kwargs, commentfile=_Recorder(results))
+    try:
+        for item in getattr(parser, method)(lines, **kwargs):
+            results.append(item)
+    finally:
+        infile.close()
+    return results
+
+
+def parse_parallel(parser, path, method='parse', jobs=None, commentfile=None,
+                   **kwargs):
+    """Parse a file with parser.method over a pool of worker processes.
+
+    Args:
+        parser: GFF2Parser, GFF3Parser or parse_gff.GFFParser instance.
+        path: file to parse (must be a regular, uncompressed file).
+        method: name of the parser method to run on each range.
+        jobs: number of worker processes (defaults to the CPU count).
+        commentfile: comment file for the parse_gff methods.
+        kwargs: other keyword arguments for the parser method.
+
+    Yields:
+        The same items, in the same order, as the serial method.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    comments = commentfile is not None
+    hold = _holds_trees(parser, method, kwargs)
+    ranges = split_ranges(path, jobs * RANGES_PER_JOB)
+    if len(ranges) > 1 and _nests(parser, method):
+        seqid = _returning_seqid(path, ranges, jobs)
+        if seqid is not None:
+            warn("Rows of {} are not together in {}; parsing it serially"
+                 .format(seqid, path))
+            for item in _parse_serial(parser, method, path, commentfile,
+                                      kwargs):
+                yield item
+            return
+    tasks = [(parser, method, path, start, end, comments, kwargs)
+             for start, end in ranges]
+
+    held = []
+    ended = False
+    for results in ordered_map(_parse_range, tasks, jobs):
+        for item in results:
+            if type(item) is _Text:
+                commentfile.write(item)
+            elif type(item) is _Release:
+                for tree in held:
+                    yield tree
+                del held[:]
+                ended = False
+            elif type(item) is _End:
+                ended = True
+            elif ended or hold and not isinstance(item, (Comment, Directive)):
+                held.append(item)
+            else:
+                yield item
+    for tree in held:
+        yield tree
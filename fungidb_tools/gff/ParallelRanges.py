@@ -0,0 +1,87 @@
+"""Cut a file into byte ranges and work on them in worker processes.
+
+split_ranges cuts a file at boundaries found by a format's own search (the
+next record, contig or // line), so each range can be read on its own
+through a RangeReader.  ordered_map runs a function over the ranges' tasks
+on a pool and yields the results back in file order.
+
+    ranges = split_ranges(path, jobs * RANGES_PER_JOB, next_record)
+    tasks = [(path, start, end) for start, end in ranges]
+    for result in ordered_map(work, tasks, jobs):
+        ...
+"""
+from __future__ import print_function, unicode_literals
+import os
+from multiprocessing import Pool
+
+# Aim for several ranges per worker so one large record or contig doesn't
+# stall the others.
+RANGES_PER_JOB = 4
+MIN_RANGE_SIZE = 1 << 20
+
+
+def binary(stream):
+    """Return the byte stream under a text file (e.g. sys.stdin)."""
+    return getattr(stream, 'buffer', stream)
+
+
+class RangeReader(object):
+
+    """Binary file read only from start up to end.
+
+    Attributes:
+        infile File: binary file, seeked to start.
+        left Int: bytes left before end.
+    """
+
+    def __init__(self, infile, start, end):
+        infile.seek(start)
+        self.infile = infile
+        self.left = end - start
+
+    def read(self, size):
+        data = self.infile.read(min(size, self.left))
+        self.left -= len(data)
+        return data
+
+
+def split_ranges(path, chunks, next_cut, size=None):
+    """Return (start, end) byte ranges covering the first size bytes of a
+    file (all of it by default), in about chunks pieces.
+
+    Args:
+        next_cut: function of (binary file, offset) returning the first
+            boundary at or after offset, or None if there is none.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    step = max(size // max(chunks, 1), MIN_RANGE_SIZE)
+    cuts = [0]
+    with open(path, 'rb') as infile:
+        target = step
+        while target < size:
+            cut = next_cut(infile, target)
+            if cut is None or cut >= size:
+                break
+            if cut > cuts[-1]:
+                cuts.append(cut)
+            target = cuts[-1] + step
+    cuts.append(size)
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a] or [(0, size)]
+
+
+def ordered_map(function, tasks, jobs):
+    """Yield function(task) for each task, in order, over jobs processes.
+
+    With one job or at most one task, the tasks are run in this process.
+    """
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield function(task)
+        return
+    pool = Pool(min(jobs, len(tasks)))
+    try:
+        for result in pool.imap(function, tasks):
+            yield result
+    finally:
+        pool.terminate()
@@ -0,0 +1,212 @@
+"""On-disk cache of parsed GFF/GTF files.
+
+Parsed items are pickled one after another into a cache file named by the
+SHA-1 of the input's contents plus the parser's class, method and options.
+Comment text that the isf parse_gff methods write out is stored in line
+with the items and replayed on a hit.  Reading a cache file is several
+times faster than parsing the text again.
+
+The cache is trimmed to a total size, dropping the least recently used files
+first.
+
+    cache = ParseCache('~/.cache/fungidb_tools')
+    for feat in cache.parse(gp.GFF3Parser(), 'genome.gff3'):
+        ...
+"""
+
+from __future__ import print_function, unicode_literals
+import hashlib
+import os
+import pickle
+import tempfile
+from warnings import warn
+from .ParallelParse import parse_parallel, _Text
+
+# Bump when the pickled feature classes change shape.
+CACHE_VERSION = 1
+SUFFIX = '.pcache'
+# Items pickled together share one memo, so repeated strings and classes are
+# written once per batch.
+BATCH_SIZE = 1000
+DEFAULT_SIZE = 1 << 30
+
+
+def file_hash(path, blocksize=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parser_options(parser):
+    """Return the parser's simple settings (filetype, fasta, comments...)."""
+    simple = (str, int, float, bool, type(None))
+    return sorted((k, v) for k, v in vars(parser).items()
+                  if isinstance(v, simple))
+
+
+class _Tee(object):
+
+    """Comment file that also records what is written into the cache."""
+
+    def __init__(self, commentfile, dump):
+        self.commentfile = commentfile
+        self.dump = dump
+
+    def write(self, text):
+        self.commentfile.write(text)
+        self.dump(_Text(text))
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+
+class ParseCache(object):
+
+    """Directory of cached parse results.
+
+    Attributes:
+        directory String: where the cache files live.
+        max_size Int: total size in bytes the directory is trimmed to.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_SIZE):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    @classmethod
+    def from_args(cls, args):
+        """Return a ParseCache for the --cache options, or None if unset."""
+        if not args.cache:
+            return None
+        return cls(args.cache, args.cache_size << 20)
+
+    def key(self, parser, path, method, kwargs):
+        digest = hashlib.sha1()
+        parts = (CACHE_VERSION, type(parser).__module__,
+                 type(parser).__name__, method, parser_options(parser),
+                 sorted(kwargs.items()))
+        digest.update(repr(parts).encode('utf-8'))
+        digest.update(file_hash(path).encode('ascii'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def parse(self, parser, path, method='parse', commentfile=None, jobs=1,
+              **kwargs):
+        """Yield the items parser.method would, reading the cache if possible.
+
+        Args:
+            parser: GFF2Parser, GFF3Parser or parse_gff.GFFParser instance.
+            path: file to parse.
+            method: name of the parser method.
+            commentfile: comment file for the parse_gff methods.
+            jobs: worker processes to parse with on a miss.
+            kwargs: other keyword arguments for the parser method.
+        """
+        cache_path = self.path(self.key(parser, path, method, kwargs))
+        try:
+            cached = open(cache_path, 'rb')
+        except (IOError, OSError):
+            return self._parse_and_store(parser, path, method, commentfile,
+                                         jobs, kwargs, cache_path)
+        return self._load(cached, cache_path, commentfile)
+
+    def _load(self, cached, cache_path, commentfile):
+        with cached:
+            try:
+                os.utime(cache_path, None)
+            except OSError:
+                pass
+            while True:
+                try:
+                    batch = pickle.load(cached)
+                except EOFError:
+                    break
+                for item in batch:
+                    if type(item) is _Text:
+                        if commentfile is not None:
+                            commentfile.write(item)
+                    else:
+                        yield item
+
+    def _parse_and_store(self, parser, path, method, commentfile, jobs,
+                         kwargs, cache_path):
+        tmp = tempfile.NamedTemporaryFile(dir=self.directory,
+                                          suffix=SUFFIX + '~', delete=False)
+
+        batch = []
+
+        def dump(item):
+            batch.append(item)
+            if len(batch) >= BATCH_SIZE:
+                pickle.dump(batch, tmp, pickle.HIGHEST_PROTOCOL)
+                del batch[:]
+
+        if commentfile is not None:
+            kwargs = dict(kwargs, commentfile=_Tee(commentfile, dump))
+        infile = None
+        try:
+            if jobs > 1:
+                items = parse_parallel(parser, path, method, jobs=jobs,
+                                       **kwargs)
+            else:
+                infile = open(path)
+                items = getattr(parser, method)(infile, **kwargs)
+            for item in items:
+                dump(item)
+                yield item
+            if batch:
+                pickle.dump(batch, tmp, pickle.HIGHEST_PROTOCOL)
+            tmp.close()
+            os.rename(tmp.name, cache_path)
+        finally:
+            if infile is not None:
+                infile.close()
+            if not tmp.closed:
+                # Parsing failed or stopped early; don't keep half a file.
+                tmp.close()
+                os.remove(tmp.name)
+        self.trim()
+
+    def trim(self):
+        """Remove the least recently used files until under max_size."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                warn("Could not remove {}: {}".format(name, e))
+                continue
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(SUFFIX):
+                os.remove(os.path.join(self.directory, name))
+
+
+def add_cache_args(parser):
+    parser.add_argument('--cache',
+                        metavar='DIR',
+                        help='cache parsed input in this directory')
+    parser.add_argument('--cache-size',
+                        type=int, default=DEFAULT_SIZE >> 20, metavar='MB',
+                        help='trim the cache to this size')
@@ -1,2 +1,3 @@
-from .rename_contig import NoMatchException, ContigRenamer
-from .rename_contig import add_rename_args
+from .rename_contig import NoMatchException, ContigRenamer, ContigMap
+from .rename_contig import add_rename_args, renamer_from_args
+from .compressed import FileType, open_file, is_compressed
@@ -0,0 +1,236 @@
+"""Read and write gzip files with worker threads.
+
+Output is written as BGZF: independent gzip members of up to 64 KB, as
+bgzip writes them.  The blocks are deflated on a pool of threads (zlib
+releases the GIL while it works), so compression scales with the cores the
+way pigz does.  BGZF is still gzip, so zcat and gzip read it back.
+
+Input is inflated on a read-ahead thread, so decompression overlaps with
+whatever the caller does with the text.  Multi-member files (including
+BGZF) are read through.
+
+    with open_file('genome.gff3.gz') as infile, \
+            open_file('genome.gff3.gz', 'w') as outfile:
+        for line in infile:
+            outfile.write(line)
+
+FileType is a drop-in for argparse.FileType that does the same by file
+extension.
+"""
+from __future__ import absolute_import, unicode_literals
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import io
+import os
+import struct
+import threading
+import zlib
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+SUFFIXES = ('.gz', '.bgz')
+# bgzip's block size; the deflated block always fits the 16-bit BSIZE.
+BGZF_BLOCK = 0xff00
+BGZF_HEADER = struct.Struct('<4BI2BH2BHH')
+BGZF_TRAILER = struct.Struct('<II')
+# The empty block bgzip ends its files with.
+BGZF_EOF = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC'
+            b'\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+READ_SIZE = 1 << 20
+READ_AHEAD = 8
+
+
+def is_compressed(path):
+    return path.endswith(SUFFIXES)
+
+
+def default_threads():
+    return os.cpu_count() or 1
+
+
+def bgzf_block(data, level=6):
+    """Return data as one BGZF block."""
+    deflate = zlib.compressobj(level, zlib.DEFLATED, -15)
+    body = deflate.compress(data) + deflate.flush()
+    header = BGZF_HEADER.pack(0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6,
+                              ord('B'), ord('C'), 2,
+                              BGZF_HEADER.size + len(body) +
+                              BGZF_TRAILER.size - 1)
+    trailer = BGZF_TRAILER.pack(zlib.crc32(data) & 0xffffffff, len(data))
+    return header + body + trailer
+
+
+class BgzfWriter(io.RawIOBase):
+
+    """Raw stream that compresses BGZF blocks on a thread pool.
+
+    Attributes:
+        name String: the output path.
+        level Int: zlib compression level.
+    """
+
+    def __init__(self, path, threads=None, level=6):
+        self.name = path
+        self.level = level
+        threads = threads or default_threads()
+        self._file = open(path, 'wb')
+        self._buffer = bytearray()
+        self._pool = ThreadPoolExecutor(threads)
+        self._pending = deque()
+        # Enough blocks in flight to keep every thread busy.
+        self._depth = threads * 4
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= BGZF_BLOCK:
+            self._submit(bytes(self._buffer[:BGZF_BLOCK]))
+            del self._buffer[:BGZF_BLOCK]
+        return len(data)
+
+    def _submit(self, data):
+        self._pending.append(self._pool.submit(bgzf_block, data, self.level))
+        while len(self._pending) > self._depth:
+            self._file.write(self._pending.popleft().result())
+
+    def _drain(self):
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            del self._buffer[:]
+        while self._pending:
+            self._file.write(self._pending.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._drain()
+            self._file.write(BGZF_EOF)
+        finally:
+            self._pool.shutdown()
+            self._file.close()
+            super(BgzfWriter, self).close()
+
+
+class ReadAheadReader(io.RawIOBase):
+
+    """Raw stream of a gzip file's contents, inflated on another thread.
+
+    Attributes:
+        name String: the input path.
+    """
+
+    def __init__(self, path, blocksize=READ_SIZE, depth=READ_AHEAD):
+        self.name = path
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._chunk = memoryview(b'')
+        self._eof = False
+        self._thread = threading.Thread(target=self._fill,
+                                        args=(path, blocksize))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def _fill(self, path, blocksize):
+        put = self._queue.put
+        try:
+            with open(path, 'rb') as infile:
+                inflate = zlib.decompressobj(31)
+                in_member = False
+                data = b''
+                while not self._stop.is_set():
+                    if not data:
+                        data = infile.read(blocksize)
+                        if not data:
+                            if in_member:
+                                raise EOFError("Truncated gzip file %s" % path)
+                            break
+                    in_member = True
+                    # Cap the output so a highly compressed block can't
+                    # balloon; the rest of the input waits in the tail.
+                    out = inflate.decompress(data, blocksize)
+                    data = inflate.unconsumed_tail
+                    if inflate.eof:
+                        # Start of the next gzip member, if any.
+                        data = inflate.unused_data
+                        inflate = zlib.decompressobj(31)
+                        in_member = False
+                    if out:
+                        put(out)
+            put(None)
+        except Exception as e:
+            put(e)
+
+    def readinto(self, b):
+        if not len(self._chunk):
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            self._chunk = memoryview(item)
+        n = min(len(b), len(self._chunk))
+        b[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        self._stop.set()
+        # Unblock the reader thread if it is waiting on a full queue.
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        super(ReadAheadReader, self).close()
+
+
+def open_file(path, mode='r', threads=None, level=6, encoding=None):
+    """Open a file, (de)compressing it if it ends with .gz or .bgz.
+
+    Modes are 'r', 'w', 'rb' and 'wb'.
+    """
+    if not is_compressed(path):
+        return io.open(path, mode, encoding=encoding)
+    if mode.startswith('r'):
+        stream = io.BufferedReader(ReadAheadReader(path), READ_SIZE)
+    elif mode.startswith('w'):
+        stream = io.BufferedWriter(BgzfWriter(path, threads, level),
+                                   BGZF_BLOCK)
+    else:
+        raise ValueError("Unsupported mode for compressed file: %s" % mode)
+    if 'b' in mode:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding)
+
+
+class FileType(argparse.FileType):
+
+    """argparse.FileType that opens .gz and .bgz paths with open_file."""
+
+    def __init__(self, mode='r', threads=None):
+        super(FileType, self).__init__(mode)
+        self._threads = threads
+
+    def __call__(self, string):
+        if string == '-' or not is_compressed(string):
+            return super(FileType, self).__call__(string)
+        try:
+            return open_file(string, self._mode, self._threads)
+        except (IOError, OSError) as e:
+            raise argparse.ArgumentTypeError(
+                "can't open '{}': {}".format(string, e))
@@ -0,0 +1,462 @@
+"""Stream a FASTA file, renaming the contigs in its headers.
+
+Only the header lines are decoded.  Sequence lines are copied through in
+large blocks, or rewrapped to a fixed width a block at a time, so no record
+is ever held in memory.  AssemblyStats can watch the written sequence to
+produce a .fai index and contig statistics in the same pass.
+
+    renamer = ContigRenamer('ncra', 2, ('SC',), (r'_(?P<number>\d+)',))
+    with open('genome.fasta', 'rb') as infile, \
+            open('out.fasta', 'wb') as outfile:
+        stream_fasta(infile, outfile, renamer)
+
+stream_fasta_parallel does the same for a regular file by cutting it into
+byte ranges at record boundaries and formatting them in worker processes.
+"""
+from __future__ import absolute_import, division, unicode_literals
+from warnings import warn
+import os
+import shutil
+import tempfile
+import warnings
+from fungidb_tools.gff.ParallelRanges import (
+    RANGES_PER_JOB, RangeReader, binary, ordered_map, split_ranges)
+from .rename_contig import NoMatchException, ContigMap
+
+BLOCK_SIZE = 1 << 20
+WHITESPACE = b' \t\r\n'
+GAP_MASK = bytes(bytearray(ord('N') if b in b'Nn' else ord(' ')
+                            for b in bytearray(range(256))))
+
+
+class LayoutError(Exception):
+
+    """Exception: Sequence lines are too uneven to index."""
+
+    pass
+
+
+def header_id(line):
+    """Return the ID of a '>' line, as Bio.SeqIO would read it."""
+    title = line[1:].rstrip(b'\r\n').decode('utf-8')
+    fields = title.split(None, 1)
+    return fields[0] if fields else ''
+
+
+def scan_fasta(infile, blocksize=BLOCK_SIZE):
+    """Split a binary FASTA stream into header lines and sequence text.
+
+    Yields (header, None) for each '>' line (without its line ending) and
+    (None, data) for the sequence text between headers, line endings
+    included, in pieces of up to about blocksize bytes.
+    """
+    line_start = True
+    pending = b''
+    while True:
+        block = infile.read(blocksize)
+        data = pending + block if pending else block
+        pending = b''
+        if not data:
+            return
+        pos = 0
+        end = len(data)
+        while pos < end:
+            if line_start and data[pos:pos + 1] == b'>':
+                eol = data.find(b'\n', pos)
+                if eol < 0:
+                    if block:
+                        # The header runs into the next block.
+                        pending = data[pos:]
+                        break
+                    eol = end
+                yield data[pos:eol].rstrip(b'\r'), None
+                pos = eol + 1
+                continue
+            i = data.find(b'\n>', pos)
+            stop = end if i < 0 else i + 1
+            yield None, data[pos:stop]
+            line_start = data[stop - 1:stop] == b'\n'
+            pos = stop
+        if not block:
+            return
+
+
+class Rewrapper(object):
+
+    """Write sequence text back out at a fixed line width.
+
+    Attributes:
+        write Function: writes bytes to the output.
+        width Int: bases per line.
+        rest Bytes: bases left over from the last full line.
+    """
+
+    def __init__(self, write, width):
+        self.write = write
+        self.width = width
+        self.rest = b''
+
+    def add(self, data):
+        data = self.rest + data.translate(None, WHITESPACE)
+        width = self.width
+        full = len(data) - len(data) % width
+        if full:
+            self.write(b'\n'.join([data[i:i + width]
+                                    for i in range(0, full, width)]) + b'\n')
+        self.rest = data[full:]
+
+    def flush(self):
+        if self.rest:
+            self.write(self.rest + b'\n')
+            self.rest = b''
+
+
+class ContigStats(object):
+
+    """Length, base composition and file layout of one written contig.
+
+    Attributes:
+        name String: contig ID.
+        offset Int: byte offset of the first base in the output.
+        length Int: number of bases.
+        gc Int: G and C bases.
+        n Int: N bases.
+        gaps Int: runs of Ns.
+        longest_gap Int: length of the longest run of Ns.
+        linebases Int: bases per full line.
+        linewidth Int: bytes per full line, including the line ending.
+    """
+
+    __slots__ = ('name', 'offset', 'length', 'gc', 'n', 'gaps',
+                 'longest_gap', 'linebases', 'linewidth', 'regular',
+                 '_nbytes', '_newlines', '_last', '_run')
+
+    def __init__(self, name, offset):
+        self.name = name
+        self.offset = offset
+        self.length = 0
+        self.gc = 0
+        self.n = 0
+        self.gaps = 0
+        self.longest_gap = 0
+        self.linebases = 0
+        self.linewidth = 0
+        self.regular = True
+        self._nbytes = 0
+        self._newlines = 0
+        self._last = b''
+        # Length of the run of Ns still open at the end of the last block.
+        self._run = 0
+
+    def add(self, data):
+        """Count a block of sequence text as written (line endings kept)."""
+        newlines = self._layout(data)
+        if b'\r' in data or b' ' in data or b'\t' in data:
+            bases = data.translate(None, WHITESPACE)
+            size = len(bases)
+        else:
+            # Line feeds are left in; they match none of the counts below.
+            bases = data
+            size = len(data) - newlines
+        if not size:
+            return
+        self.length += size
+        # Deleting a class of bytes is quicker than counting each byte.
+        self.gc += len(bases) - len(bases.translate(None, b'GCgcSs'))
+        n = bases.count(b'N')
+        if b'n' in bases:
+            n += bases.count(b'n')
+        if not n:
+            self._end_gap(self._run)
+            self._run = 0
+            return
+        self.n += n
+        # Ns become N and everything else a space, so splitting the block
+        # gives its runs of Ns.
+        mask = bases.translate(GAP_MASK, WHITESPACE)
+        runs = [len(run) for run in mask.split()]
+        if mask.startswith(b'N'):
+            runs[0] += self._run
+        else:
+            self._end_gap(self._run)
+        self._run = runs.pop() if mask.endswith(b'N') else 0
+        if runs:
+            self.gaps += len(runs)
+            self.longest_gap = max(self.longest_gap, max(runs))
+
+    def _end_gap(self, run):
+        if run:
+            self.gaps += 1
+            self.longest_gap = max(self.longest_gap, run)
+
+    def _layout(self, data):
+        """Check that every full line has the first line's width.
+
+        Returns the number of line feeds in data.
+        """
+        newlines = data.count(b'\n')
+        if not self.linewidth:
+            i = data.find(b'\n')
+            if i < 0:
+                self._nbytes += len(data)
+                self._last = data[-1:] or self._last
+                return newlines
+            self.linewidth = self._nbytes + i + 1
+            cr = data[i - 1:i] == b'\r' if i else self._last == b'\r'
+            self.linebases = self.linewidth - 1 - cr
+        width = self.linewidth
+        # Every byte at a line end's position must be a line ending.
+        ends = data[(width - 1 - self._nbytes) % width::width]
+        if ends.count(b'\n') != len(ends):
+            self.regular = False
+        self._nbytes += len(data)
+        self._newlines += newlines
+        self._last = data[-1:] or self._last
+        return newlines
+
+    def close(self):
+        self._end_gap(self._run)
+        self._run = 0
+        if not self.linewidth:
+            # One line without a line ending (or no sequence at all).
+            self.linebases = self.linewidth = self._nbytes
+        else:
+            full, rest = divmod(self._nbytes, self.linewidth)
+            if self._newlines != full + (rest > 0 and self._last == b'\n'):
+                self.regular = False
+
+    def gc_percent(self):
+        called = self.length - self.n
+        return 100 * self.gc / called if called else 0.0
+
+    def fai(self):
+        """Return the contig's samtools .fai line."""
+        if not self.regular:
+            raise LayoutError("Uneven line lengths in {}; rewrap it to index "
+                              "it".format(self.name))
+        return '\t'.join((self.name, str(self.length), str(self.offset),
+                          str(self.linebases), str(self.linewidth)))
+
+
+def n50(lengths, fraction=0.5):
+    """Return (N50, L50) of the contig lengths."""
+    lengths = sorted(lengths, reverse=True)
+    target = sum(lengths) * fraction
+    total = 0
+    for i, length in enumerate(lengths):
+        total += length
+        if total >= target:
+            return length, i + 1
+    return 0, 0
+
+
+class AssemblyStats(object):
+
+    """Contig statistics gathered as a FASTA file is written.
+
+    Attributes:
+        contigs ContigStats List: contigs in file order.
+        offset Int: bytes written so far.
+    """
+
+    def __init__(self):
+        self.contigs = []
+        self.offset = 0
+
+    def header(self, header):
+        """Start a contig after its header line (bytes) is written."""
+        self.close()
+        self.offset += len(header)
+        name = header_id(header)
+        self.contigs.append(ContigStats(name, self.offset))
+
+    def tee(self, write):
+        """Return a write function that counts sequence text, then writes."""
+        def write_sequence(data):
+            self.contigs[-1].add(data)
+            self.offset += len(data)
+            write(data)
+        return write_sequence
+
+    def close(self):
+        if self.contigs:
+            self.contigs[-1].close()
+
+    def append(self, other):
+        """Add the contigs of a piece written after everything so far."""
+        for contig in other.contigs:
+            contig.offset += self.offset
+        self.contigs.extend(other.contigs)
+        self.offset += other.offset
+
+    def write_fai(self, outfile):
+        for contig in self.contigs:
+            outfile.write(contig.fai() + '\n')
+
+    def write_report(self, outfile):
+        """Write summary lines (#) then a row per contig, tab-separated."""
+        lengths = [c.length for c in self.contigs]
+        total = sum(lengths)
+        gc = sum(c.gc for c in self.contigs)
+        n = sum(c.n for c in self.contigs)
+        n50_length, l50 = n50(lengths)
+        summary = (
+            ('contigs', len(self.contigs)),
+            ('total_length', total),
+            ('gc_percent', '{:.2f}'.format(
+                100 * gc / (total - n) if total > n else 0.0)),
+            ('n_bases', n),
+            ('gaps', sum(c.gaps for c in self.contigs)),
+            ('longest_gap', max([c.longest_gap for c in self.contigs] or
+                                [0])),
+            ('n50', n50_length),
+            ('l50', l50),
+        )
+        for key, value in summary:
+            outfile.write('# {}\t{}\n'.format(key, value))
+        outfile.write('\t'.join(('name', 'length', 'gc_percent', 'n_bases',
+                                 'gaps', 'longest_gap')) + '\n')
+        for c in self.contigs:
+            outfile.write('{}\t{}\t{:.2f}\t{}\t{}\t{}\n'.format(
+                c.name, c.length, c.gc_percent(), c.n, c.gaps,
+                c.longest_gap))
+
+
+class FastaStreamer(object):
+
+    """Rename the headers of a FASTA stream.
+
+    Attributes:
+        renamer ContigRenamer: renames the header IDs (or a ContigMap).
+        contigs ContigMap: old and new names are added here, if given.
+        wrap Int: bases per line to rewrap to; None copies lines as they are.
+        stats AssemblyStats: filled in with the written contigs, if given.
+    """
+
+    def __init__(self, renamer, contigs=None, wrap=None, stats=None):
+        self.renamer = renamer
+        self.contigs = contigs
+        self.wrap = wrap
+        self.stats = stats
+
+    def header(self, line):
+        """Return the renamed header line, or None to skip the record."""
+        old_id = header_id(line)
+        try:
+            new_id = self.renamer.rename(old_id)
+        except NoMatchException:
+            warn("SKIPPED: {} matches no provided regex.".format(old_id))
+            return None
+        if self.contigs is not None:
+            self.contigs.add(old_id, new_id)
+        return b'>' + new_id.encode('utf-8') + b'\n'
+
+    def stream(self, infile, outfile):
+        """Copy infile to outfile (both binary) with the headers renamed."""
+        write = outfile.write
+        stats = self.stats
+        write_sequence = stats.tee(write) if stats else write
+        wrapper = Rewrapper(write_sequence, self.wrap) if self.wrap else None
+        copy = wrapper.add if wrapper else write_sequence
+        # Anything before the first header is dropped, as SeqIO does.
+        skip = True
+        for line, data in scan_fasta(infile):
+            if line is None:
+                if not skip:
+                    copy(data)
+                continue
+            if wrapper:
+                wrapper.flush()
+            header = self.header(line)
+            skip = header is None
+            if not skip:
+                write(header)
+                if stats:
+                    stats.header(header)
+        if wrapper:
+            wrapper.flush()
+        if stats:
+            stats.close()
+
+
+def stream_fasta(infile, outfile, renamer, contigs=None, wrap=None,
+                 stats=None):
+    """Copy a FASTA file with renamed headers; see FastaStreamer."""
+    FastaStreamer(renamer, contigs, wrap, stats).stream(binary(infile),
+                                                        binary(outfile))
+
+
+def _next_record(infile, offset, blocksize=1 << 16):
+    """Return the offset of the first '>' line starting after offset."""
+    infile.seek(max(offset - 1, 0))
+    pos = infile.tell()
+    tail = b''
+    while True:
+        block = infile.read(blocksize)
+        if not block:
+            return None
+        data = tail + block
+        i = data.find(b'\n>')
+        if i >= 0:
+            return pos - len(tail) + i + 1
+        pos += len(block)
+        tail = data[-1:]
+
+
+def split_records(path, chunks):
+    """Return (start, end) byte ranges that break before '>' lines."""
+    return split_ranges(path, chunks, _next_record)
+
+
+def _format_range(task):
+    path, start, end, renamer, wrap, with_stats, tmpdir = task
+    contigs = ContigMap()
+    stats = AssemblyStats() if with_stats else None
+    fd, outpath = tempfile.mkstemp(dir=tmpdir, suffix='.fasta')
+    # Warnings are passed back so they come out in file order.
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        with open(path, 'rb') as infile, os.fdopen(fd, 'wb') as outfile:
+            streamer = FastaStreamer(renamer, contigs, wrap, stats)
+            streamer.stream(RangeReader(infile, start, end), outfile)
+    messages = [str(w.message) for w in caught]
+    names = [(old, new) for old, new, _ in contigs.entries]
+    return outpath, names, stats, messages
+
+
+def stream_fasta_parallel(path, outfile, renamer, contigs=None, wrap=None,
+                          stats=None, jobs=None, tmpdir=None):
+    """Format a FASTA file over a pool of worker processes.
+
+    Each worker streams its byte range into a temporary file, which is
+    copied to outfile in file order, so the output, contig map, stats and
+    warnings are the same as stream_fasta's.
+
+    Args:
+        path: file to format (must be a regular, uncompressed file).
+        outfile: output file.
+        jobs: number of worker processes (defaults to the CPU count).
+        tmpdir: directory for the workers' temporary files.
+        renamer, contigs, wrap, stats: as for FastaStreamer.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    outfile = binary(outfile)
+    workdir = tempfile.mkdtemp(dir=tmpdir)
+    tasks = [(path, start, end, renamer, wrap, stats is not None, workdir)
+             for start, end in split_records(path, jobs * RANGES_PER_JOB)]
+
+    try:
+        for outpath, names, piece_stats, messages in ordered_map(
+                _format_range, tasks, jobs):
+            for message in messages:
+                warn(message)
+            if contigs is not None:
+                for old, new in names:
+                    contigs.add(old, new)
+            if stats is not None:
+                stats.append(piece_stats)
+            with open(outpath, 'rb') as piece:
+                shutil.copyfileobj(piece, outfile, BLOCK_SIZE)
+            os.remove(outpath)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
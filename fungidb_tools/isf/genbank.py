@@ -0,0 +1,421 @@
+"""Scan the feature tables of a GenBank file without reading the sequence.
+
+Records are read a block at a time.  The FEATURES table of each record is
+split into features and qualifiers the way Bio.SeqIO does, and everything
+from ORIGIN to the closing // is skipped with a byte search, so the
+sequence is never split into lines or decoded.
+
+    with open('genome.gbf', 'rb') as infile:
+        for record in scan_records(infile):
+            for feature in record.features:
+                print(feature.type, feature.qualifiers.get('locus_tag'))
+
+GenBankIndex records where each record starts and ends, so a record can be
+read (or parsed with Bio.SeqIO) without reading the ones before it.  The
+index is kept next to the file, as genome.gbf.gbi.
+
+    index = GenBankIndex.open('genome.gbf')
+    record = index.get_record('SC12')
+
+split_records cuts a file into byte ranges that end on // lines, so the
+ranges can be scanned in separate processes.
+"""
+from __future__ import absolute_import, unicode_literals
+import io
+import os
+import re
+from warnings import warn
+from fungidb_tools.gff.ParallelRanges import binary, split_ranges
+
+BLOCK_SIZE = 1 << 20
+INDEX_SUFFIX = '.gbi'
+R_LOCUS_LENGTH = re.compile(br'\s(\d+) (?:bp|aa)\b')
+QUALIFIER_INDENT = 21
+QUALIFIER_SPACER = b' ' * QUALIFIER_INDENT
+# Qualifiers whose wrapped lines are joined without spaces.
+NO_SPACE_QUALIFIERS = frozenset(('translation',))
+
+
+class GenBankError(Exception):
+    pass
+
+
+class GenBankFeature(object):
+
+    """One entry of a FEATURES table.
+
+    Attributes:
+        type String: feature key (gene, mRNA, CDS...).
+        location String: location as written, wrapped lines joined.
+        qualifiers String String List Dict: qualifier values by key, as
+            Bio.SeqFeature.qualifiers holds them.
+    """
+
+    __slots__ = ('type', 'location', 'qualifiers')
+
+    def __init__(self, type, location, qualifiers):
+        self.type = type
+        self.location = location
+        self.qualifiers = qualifiers
+
+
+class GenBankRecord(object):
+
+    """The LOCUS name and features of a record.
+
+    Attributes:
+        name String: name from the LOCUS line (SeqRecord.name).
+        features GenBankFeature List: features in file order.
+        offset Int: byte offset of the LOCUS line.
+    """
+
+    __slots__ = ('name', 'features', 'offset')
+
+    def __init__(self, name, offset=0):
+        self.name = name
+        self.features = []
+        self.offset = offset
+
+
+class _Lines(object):
+
+    """Lines of a binary stream, with a fast skip to the next // line."""
+
+    def __init__(self, infile, blocksize=BLOCK_SIZE, offset=0):
+        self.infile = infile
+        self.blocksize = blocksize
+        self.buf = b''
+        self.pos = 0
+        # File offset of buf[0].
+        self.base = offset
+
+    def tell(self):
+        return self.base + self.pos
+
+    def _fill(self):
+        block = self.infile.read(self.blocksize)
+        if not block:
+            return False
+        self.base += self.pos
+        self.buf = self.buf[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def readline(self):
+        i = self.buf.find(b'\n', self.pos)
+        while i < 0:
+            searched = len(self.buf) - self.pos
+            if not self._fill():
+                line = self.buf[self.pos:]
+                self.pos = len(self.buf)
+                return line
+            i = self.buf.find(b'\n', self.pos + searched)
+        line = self.buf[self.pos:i + 1]
+        self.pos = i + 1
+        return line
+
+    def unread(self, line):
+        """Push back the line readline just returned."""
+        self.pos -= len(line)
+
+    def skip_record(self):
+        """Skip to the next line starting with //."""
+        while True:
+            if self.buf.startswith(b'//', self.pos):
+                return
+            i = self.buf.find(b'\n//', self.pos)
+            if i >= 0:
+                self.pos = i + 1
+                return
+            # Keep the last byte in case it starts a \n// split over blocks.
+            self.pos = max(self.pos, len(self.buf) - 1)
+            if not self._fill():
+                self.pos = len(self.buf)
+                return
+
+
+def _qualifier_value(key, lines):
+    """Join a qualifier's lines and unquote it as Bio.GenBank does."""
+    value = ('' if key in NO_SPACE_QUALIFIERS else ' ').join(lines)
+    if key in NO_SPACE_QUALIFIERS:
+        value = ''.join(value.split())
+    if len(value) > 1 and value[0] == '"' and value[-1] == '"':
+        value = value[1:-1]
+    return value.replace('""', '"')
+
+
+def parse_feature(key, lines):
+    """Return a GenBankFeature from its key and stripped lines."""
+    lines = [line for line in lines if line]
+    if not lines:
+        raise GenBankError("Problem with '%s' feature" % key)
+    location = lines[0]
+    i = 1
+    while location.endswith(',') and i < len(lines):
+        location += lines[i]
+        i += 1
+    if i < len(lines) and lines[i].startswith(')'):
+        location += lines[i]
+        i += 1
+
+    qualifiers = {}
+    qkey = None
+    value = None
+    quoted = False
+    for line in lines[i:]:
+        if quoted:
+            # Inside a quoted value, even lines starting with / are text.
+            value.append(line)
+            quoted = not line.endswith('"')
+        elif line.startswith('/'):
+            if qkey is not None:
+                _add_qualifier(qualifiers, qkey, value)
+            eq = line.find('=')
+            if eq < 0:
+                qkey, value = line[1:], None
+                continue
+            qkey = line[1:eq]
+            first = line[eq + 1:]
+            if first.lstrip().startswith('"'):
+                first = first.lstrip()
+            value = [first]
+            quoted = (first.startswith('"') and first != '"' and
+                      not first.endswith('"'))
+        elif value is None:
+            raise GenBankError("Problem with '%s' feature" % key)
+        else:
+            value.append(line)
+    if qkey is not None:
+        _add_qualifier(qualifiers, qkey, value)
+    return GenBankFeature(key, location, qualifiers)
+
+
+def _add_qualifier(qualifiers, key, lines):
+    if lines is None:
+        # Keys without values (/pseudo) are kept once, as [''].
+        qualifiers.setdefault(key, [''])
+        return
+    qualifiers.setdefault(key, []).append(_qualifier_value(key, lines))
+
+
+def _read_features(lines, record, keep):
+    """Read a FEATURES table, stopping before the first line after it."""
+    key = None
+    body = []
+    while True:
+        line = lines.readline()
+        if not line:
+            raise GenBankError("Premature end of file in %s" % record.name)
+        if line.startswith(QUALIFIER_SPACER) or not line.strip():
+            if key is not None:
+                body.append(line[QUALIFIER_INDENT:].strip().decode('utf-8'))
+            continue
+        if key is not None:
+            record.features.append(parse_feature(key, body))
+            key = None
+        if not line.startswith(b'  '):
+            # ORIGIN, CONTIG, BASE COUNT or //.
+            lines.unread(line)
+            return
+        line = line.rstrip()
+        feature_key = line[2:QUALIFIER_INDENT].strip().decode('utf-8')
+        if keep is not None and not keep(feature_key):
+            continue
+        key = feature_key
+        body = [line[QUALIFIER_INDENT:].strip().decode('utf-8')]
+
+
+def locus_name(line):
+    """Return the record name from a LOCUS line."""
+    fields = line.split()
+    return fields[1].decode('utf-8') if len(fields) > 1 else ''
+
+
+def locus_length(line):
+    """Return the sequence length from a LOCUS line, or -1."""
+    match = R_LOCUS_LENGTH.search(line)
+    return int(match.group(1)) if match else -1
+
+
+def scan_records(infile, keep=None, offset=0):
+    """Yield a GenBankRecord for each record of a GenBank file.
+
+    Args:
+        infile: binary (or text, read through its buffer) stream.
+        keep: feature key predicate; other features are skipped unparsed.
+        offset: file offset infile starts at, for GenBankRecord.offset.
+    """
+    lines = _Lines(binary(infile), offset=offset)
+    record = None
+    while True:
+        offset = lines.tell()
+        line = lines.readline()
+        if not line:
+            break
+        if line.startswith(b'LOCUS'):
+            record = GenBankRecord(locus_name(line), offset)
+        elif record is None:
+            continue
+        elif line.startswith(b'FEATURES'):
+            _read_features(lines, record, keep)
+        elif line.startswith(b'ORIGIN'):
+            lines.skip_record()
+        elif line.startswith(b'//'):
+            yield record
+            record = None
+    if record is not None:
+        raise GenBankError("Premature end of file in %s" % record.name)
+
+
+def _record_end(infile, offset, blocksize=1 << 16):
+    """Return the offset just past the first // line after offset, or None."""
+    infile.seek(offset)
+    lines = _Lines(infile, blocksize, offset)
+    # Finish the line offset falls in.
+    lines.readline()
+    lines.skip_record()
+    if not lines.readline():
+        return None
+    return lines.tell()
+
+
+def split_records(path, chunks):
+    """Return (start, end) byte ranges that break after // lines."""
+    return split_ranges(path, chunks, _record_end)
+
+
+class GenBankEntry(object):
+
+    """Location of one record, as in a .gbi line.
+
+    Attributes:
+        name String: record name from the LOCUS line.
+        offset Int: byte offset of the LOCUS line.
+        length Int: bytes up to and including the // line.
+        seqlength Int: sequence length from the LOCUS line (-1 if missing).
+    """
+
+    __slots__ = ('name', 'offset', 'length', 'seqlength')
+
+    def __init__(self, name, offset, length, seqlength):
+        self.name = name
+        self.offset = offset
+        self.length = length
+        self.seqlength = seqlength
+
+    def format(self):
+        return '\t'.join((self.name, str(self.offset), str(self.length),
+                          str(self.seqlength)))
+
+
+class GenBankIndex(object):
+
+    """Byte ranges of the records in a GenBank file.
+
+    Attributes:
+        path String: the indexed file (None if built from a stream).
+        entries String GenBankEntry Dict: entries by name, in file order.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+
+    @classmethod
+    def open(cls, path, save=True):
+        """Load the sidecar index of a file, rebuilding it if stale."""
+        index = cls.load(path)
+        if index is None:
+            with io.open(path, 'rb') as infile:
+                index = cls.build(infile, path)
+            if save:
+                index.save()
+        return index
+
+    @classmethod
+    def build(cls, infile, path=None):
+        """Index a binary stream in one pass over its LOCUS and // lines."""
+        index = cls(path)
+        lines = _Lines(infile)
+        entry = None
+        while True:
+            offset = lines.tell()
+            line = lines.readline()
+            if not line:
+                break
+            if line.startswith(b'LOCUS'):
+                entry = GenBankEntry(locus_name(line), offset, 0,
+                                     locus_length(line))
+                # Everything up to // is skipped with a byte search.
+                lines.skip_record()
+            elif line.startswith(b'//') and entry is not None:
+                entry.length = lines.tell() - entry.offset
+                index.add(entry)
+                entry = None
+        if entry is not None:
+            raise GenBankError("Premature end of file in %s" % entry.name)
+        return index
+
+    def add(self, entry):
+        if entry.name in self.entries:
+            raise GenBankError("Duplicate record %s" % entry.name)
+        self.entries[entry.name] = entry
+
+    @staticmethod
+    def index_path(path):
+        return path + INDEX_SUFFIX
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return '# {} {}'.format(st.st_size, st.st_mtime_ns)
+
+    @classmethod
+    def load(cls, path):
+        """Return the index saved next to path, or None if missing or stale."""
+        try:
+            with io.open(cls.index_path(path), encoding='utf-8') as infile:
+                if infile.readline().rstrip('\n') != cls._stamp(path):
+                    return None
+                index = cls(path)
+                for line in infile:
+                    name, offset, length, seqlength = line.rstrip('\n').split(
+                        '\t')
+                    index.add(GenBankEntry(name, int(offset), int(length),
+                                           int(seqlength)))
+        except (IOError, OSError, ValueError):
+            return None
+        return index
+
+    def save(self):
+        index_path = self.index_path(self.path)
+        tmp = index_path + '~'
+        try:
+            with io.open(tmp, 'w', encoding='utf-8') as outfile:
+                outfile.write(self._stamp(self.path) + '\n')
+                for entry in self.entries.values():
+                    outfile.write(entry.format() + '\n')
+            os.rename(tmp, index_path)
+        except (IOError, OSError) as e:
+            warn("Could not save index {}: {}".format(index_path, e))
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def raw(self, name):
+        """Return the text of one record."""
+        entry = self.entries[name]
+        with io.open(self.path, 'rb') as infile:
+            infile.seek(entry.offset)
+            return infile.read(entry.length).decode('utf-8')
+
+    def get_record(self, name):
+        """Return one record parsed by Bio.SeqIO as a SeqRecord."""
+        from Bio import SeqIO
+        return SeqIO.read(io.StringIO(self.raw(name)), 'genbank')
@@ -11,22 +11,104 @@ Edward Liaw
 
 from __future__ import print_function
 from __future__ import unicode_literals
+import re
 import sys
+from sys import intern
 import urllib.parse
 from warnings import warn
 from collections import OrderedDict
+from functools import lru_cache
+from fungidb_tools.gff.ExternalSort import ExternalSort
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+# Values made only of these characters come through quote(unquote()) as is.
+R_PLAIN_VALUE = re.compile(r'[A-Za-z0-9_.~/-]*')
+
+# Feature uses __slots__ and pickles as its constructor arguments, for the
+# external sort's spill files; the seqid, source and type of each line are
+# interned.
 
 
 class ParseError(Exception):
     pass
 
 
+@lru_cache(maxsize=1 << 16)
+def requote(value):
+    """Normalize percent-encoding; repeated values are cached."""
+    return urllib.parse.quote(urllib.parse.unquote(value))
+
+
+class LazyAttributes(MutableMapping):
+
+    """Attributes column that is split and decoded on first use.
+
+    Looking up a single tag (ID, Parent, gene_id...) before then only decodes
+    that tag.  Until the mapping is modified, the raw column is what gets
+    written back out.
+
+    Attributes:
+        raw String: attributes column as read.
+        parser GFFParser: parser with the column's delimiters.
+        modified Bool: whether any attribute was set or removed.
+    """
+
+    __slots__ = ('raw', 'parser', '_attr', 'modified')
+
+    def __init__(self, raw, parser):
+        self.raw = raw
+        self.parser = parser
+        self._attr = None
+        self.modified = False
+
+    def _decoded(self):
+        if self._attr is None:
+            self._attr, _ = self.parser.split_attributes(self.raw)
+        return self._attr
+
+    def __getitem__(self, key):
+        if self._attr is None:
+            return self.parser.find_attribute(self.raw, key)
+        return self._attr[key]
+
+    def __setitem__(self, key, value):
+        self._decoded()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._decoded()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._decoded())
+
+    def __len__(self):
+        return len(self._decoded())
+
+    def __repr__(self):
+        return "LazyAttributes({!r})".format(self.raw)
+
+    def __reduce__(self):
+        if self._attr is None:
+            return (LazyAttributes, (self.raw, self.parser))
+        return (LazyAttributes, (self.raw, self.parser),
+                (None, {'_attr': self._attr, 'modified': self.modified}))
+
+
 class Feature(object):
+    __slots__ = ('seqid', 'source', 'soterm', 'start', 'end', 'more_pos',
+                 'score', 'strand', 'phase', 'attr', 'comment', 'children')
+
     def __init__(self, seqid, source, soterm, pos, score, strand, phase, attr, comment, children):
         """Create a new Feature.
-        pos: list of tuples (start, end)
-        attr: OrderedDict of attributes
-        children: list of child Features
+        pos: sequence of (start, end) tuples, one per line; the first line's
+            are kept as int start and end, the rest in more_pos
+        attr: mapping of attributes (OrderedDict or LazyAttributes)
+        children: list of child Features (an empty tuple until one is added)
         """
         self.seqid = seqid
         self.source = source
@@ -39,32 +121,52 @@ class Feature(object):
         self.comment = comment
         self.children = children
 
+    def __reduce__(self):
+        return (Feature, (self.seqid, self.source, self.soterm, self.pos,
+                          self.score, self.strand, self.phase, self.attr,
+                          self.comment, self.children))
+
+    @property
+    def pos(self):
+        return ((self.start, self.end),) + self.more_pos
+
+    @pos.setter
+    def pos(self, pos):
+        pos = [(int(start), int(end)) for start, end in pos]
+        (self.start, self.end), self.more_pos = pos[0], tuple(pos[1:])
+
     @classmethod
     def unflatten(cls, cols, attr, comment="", children=None):
-        """Make new Feature out of list of GFF columns and OrderedDict of attributes."""
+        """Make new Feature out of list of GFF columns and mapping of attributes."""
         seqid, source, soterm, start, end, score, strand, phase = cols
-        pos = [(start, end)]
-        children = [] if children is None else children
+        seqid = intern(seqid)
+        source = intern(source)
+        soterm = intern(soterm)
+        pos = ((start, end),)
+        children = () if children is None else children
         return cls(seqid, source, soterm, pos, score, strand, phase, attr, comment, children)
 
     def flatten(self):
         """Reduce Feature into GFF columns, attributes, and comment."""
         for vals in self._flatten():
             yield vals
-        for vals in self._flatten_children():
+        for vals in self._flatten_children(set()):
             yield vals
 
     def _flatten(self):
         for start, end in self.pos:
-            cols = [self.seqid, self.source, self.soterm, start, end, self.score, self.strand, self.phase]
+            cols = [self.seqid, self.source, self.soterm, str(start), str(end), self.score, self.strand, self.phase]
             yield cols, self.attr, self.comment
 
-    def _flatten_children(self):
-        for child in self.children:
+    def _flatten_children(self, seen):
+        # A child with several parents is only written under the first.
+        children = [child for child in self.children if id(child) not in seen]
+        seen.update(id(child) for child in children)
+        for child in children:
             for multichild in child._flatten():
                 yield multichild
-        for child in self.children:
-            for subchild in child._flatten_children():
+        for child in children:
+            for subchild in child._flatten_children(seen):
                 yield subchild
 
     def append(self, other):
@@ -82,7 +184,7 @@ class Feature(object):
                     warn("Multiple parents:\t{}\t{}".format(other, other.attr['Parent']))
                 added = False
                 if self.attr['ID'] == parent:
-                    self.children.append(other)
+                    self._add_child(other)
                     added = True
                 else:
                     # See if any of the children are parents.
@@ -97,12 +199,18 @@ class Feature(object):
 
     def append_multiline(self, other):
         """Add multiline feature's position."""
-        self.pos += other.pos
+        self.more_pos += other.pos
         warn("Multi-line feature:\t{}\t{}".format(self, other))
 
     def append_child(self, other):
         assert self.attr['ID'] in other.attr['Parent'].split(',')
-        self.children.append(other)
+        self._add_child(other)
+
+    def _add_child(self, other):
+        if self.children:
+            self.children.append(other)
+        else:
+            self.children = [other]
 
     def rename(self, name):
         self.attr['ID'] = name
@@ -110,16 +218,121 @@ class Feature(object):
             child.attr['Parent'] = name
 
     def __str__(self):
-        start, end = self.pos[0]
-        return "{}:{}{}{}-{}".format(self.soterm, self.seqid, self.strand, start, end)
+        return "{}:{}{}{}-{}".format(self.soterm, self.seqid, self.strand, self.start, self.end)
+
+    def sort_key(self):
+        """(seqid, start, end) over all of the feature's positions."""
+        return (self.seqid, min(start for start, end in self.pos),
+                max(end for start, end in self.pos))
+
+    def sort_children(self):
+        """Order the children (and theirs) by position."""
+        if self.children:
+            self.children.sort(key=Feature.sort_key)
+            for child in self.children:
+                child.sort_children()
+
+    def __lt__(self, other):
+        return self.sort_key() < other.sort_key()
 
     def __gt__(self, other):
-        if self.chrom != other.chrom:
-            return self.chrom > other.chrom
-        elif self.min != other.min:
-            return self.min > other.min
-        else:
-            return self.min > other.max
+        return self.sort_key() > other.sort_key()
+
+
+def split_parents(value):
+    """Split a Parent value; split_pair leaves its commas quoted."""
+    return value.replace('%2C', ',').split(',')
+
+
+def nest_features(features, stream=True):
+    """Fill features with children and yield top-level parents only.
+
+    Features are indexed by ID as they arrive, so children may come before
+    or after their parents and may have several parents.  A multi-line
+    feature (the same ID on several lines) is merged into one Feature.  In
+    stream mode, finished trees are yielded whenever the seqid changes;
+    otherwise all of them are held until the end.
+    """
+    tops = []
+    by_id = {}
+    waiting = {}
+    seqid = None
+
+    def flush():
+        # A child missing several parents is still placed once.
+        orphans = set()
+        for parent, children in waiting.items():
+            for child in children:
+                warn("Missing parent:\t{}\t{}".format(child, parent))
+                if child not in orphans:
+                    orphans.add(child)
+                    tops.append(child)
+        done = list(tops)
+        del tops[:]
+        by_id.clear()
+        waiting.clear()
+        return done
+
+    for feat in features:
+        if stream and feat.seqid != seqid:
+            for top in flush():
+                yield top
+            seqid = feat.seqid
+
+        id = feat.attr.get('ID')
+        if id is not None:
+            other = by_id.get(id)
+            if other is not None:
+                other.append_multiline(feat)
+                continue
+            by_id[id] = feat
+            for child in waiting.pop(id, ()):
+                feat._add_child(child)
+
+        parent_ids = feat.attr.get('Parent')
+        if parent_ids is None:
+            tops.append(feat)
+            continue
+        for parent_id in split_parents(parent_ids):
+            parent = by_id.get(parent_id)
+            if parent is not None:
+                parent._add_child(feat)
+            else:
+                waiting.setdefault(parent_id, []).append(feat)
+
+    for top in flush():
+        yield top
+
+
+def sort_features(features, run_size=100000, tmpdir=None):
+    """Yield features (or whole trees) sorted by seqid, start and end.
+
+    At most run_size features are held in memory; the rest are spilled to
+    sorted runs on disk and merged back.  Trees stay together, with parents
+    ahead of their children and the children sorted too.
+    """
+    runs = ExternalSort(key=Feature.sort_key, run_size=run_size,
+                        tmpdir=tmpdir)
+    for feat in features:
+        feat.sort_children()
+        runs.add(feat)
+    for feat in runs:
+        yield feat
+
+
+def sort_trees(features, run_size=100000, tmpdir=None):
+    """Nest unnested features and yield the trees sorted as sort_features.
+
+    The rows are sorted before they are nested, so each contig's rows are
+    together and the nest can stream.  The sort holds run_size rows at a
+    time, but nest_features holds a whole contig before releasing its
+    trees, so memory is bounded per contig rather than per run.  Parents
+    come out ahead of their children because of the nesting, not the sort
+    key: a child may start before its parent.
+    """
+    for top in nest_features(sort_features(features, run_size, tmpdir)):
+        top.sort_children()
+        yield top
 
 
 class GFFParser(object):
@@ -165,46 +378,71 @@ class GFFParser(object):
             cols = line.split(self.d_column, 9)
             # Attributes column
             attr_col = cols.pop()
-            attr = OrderedDict()
-
-            comments = []
-
-            for pair in attr_col.rstrip(self.d_attribute).split(self.d_attribute):
-                s_pair = pair.strip()
-                if comments or s_pair.startswith('#'):
-                    # If there are delimiters inside the inline comment, append
-                    # it now and join the list later.
-                    comments.append(pair)
-                    continue
-                try:
-                    key, val = s_pair.split(self.d_key, 2)
-                    val = urllib.parse.quote(urllib.parse.unquote(val.strip(self.d_quotes)))
-                    attr[key] = val
-                except ValueError:
-                    raise ParseError("FAILED to split: %s\nAt %s using %s" % (line, s_pair, self.d_key))
-            comment = self.d_attribute.join(comments)
+            if '#' in attr_col:
+                # Split off inline comments now.
+                attr, comment = self.split_attributes(attr_col)
+            else:
+                attr, comment = LazyAttributes(attr_col, self), ""
             yield cols, attr, comment
 
+    def split_attributes(self, attr_col):
+        """Decode an attributes column into (OrderedDict, inline comment)."""
+        attr = OrderedDict()
+        comments = []
+
+        for pair in attr_col.rstrip(self.d_attribute).split(self.d_attribute):
+            s_pair = pair.strip()
+            if comments or s_pair.startswith('#'):
+                # If there are delimiters inside the inline comment, append
+                # it now and join the list later.
+                comments.append(pair)
+                continue
+            key, val = self.split_pair(s_pair, attr_col)
+            attr[key] = val
+        comment = self.d_attribute.join(comments)
+        return attr, comment
+
+    def split_pair(self, s_pair, attr_col=''):
+        try:
+            key, val = s_pair.split(self.d_key, 2)
+        except ValueError:
+            raise ParseError("FAILED to split: %s\nAt %s using %s" % (attr_col, s_pair, self.d_key))
+        val = val.strip(self.d_quotes)
+        if not R_PLAIN_VALUE.fullmatch(val):
+            val = requote(val)
+        return key, val
+
+    def find_attribute(self, attr_col, key):
+        """Decode one attribute without splitting the rest of the column."""
+        prefix = key + self.d_key
+        # The last occurrence wins, as it would in the full mapping.
+        for pair in reversed(attr_col.split(self.d_attribute)):
+            s_pair = pair.strip()
+            if s_pair.startswith(prefix):
+                return self.split_pair(s_pair, attr_col)[1]
+        raise KeyError(key)
+
     def parse(self, infile, commentfile=sys.stdout):
         """Parse lines as Features instead of (columns, attributes)."""
         for cols, attr, comment in self.parse_flat(infile, commentfile):
             yield Feature.unflatten(cols, attr, comment)
 
-    def parse_3level_sorted(self, infile, commentfile=sys.stdout):
+    def parse_3level(self, infile, commentfile=sys.stdout, stream=True):
         """Fill features with children and yield top-level parents only.
-        Assumes children follow parent.
+        See nest_features.
         """
-        top = None
-        for feat in self.parse(infile, commentfile):
-            if top is None:
-                top = feat
-            elif not top.append(feat):
-                yield top
-                top = feat
+        return nest_features(self.parse(infile, commentfile), stream)
+
+    def parse_3level_sorted(self, infile, commentfile=sys.stdout):
+        return self.parse_3level(infile, commentfile)
 
     def join_flat(self, cols, attr, comment=""):
         """Convert flattened feature attributes into a GFF string."""
-        attrs = [self.d_key.join((key, val.join((self.d_quotes, self.d_quotes)))) for key, val in attr.items()]
+        if isinstance(attr, LazyAttributes) and not attr.modified:
+            # Untouched attributes are written back exactly as they were read.
+            attrs = [attr.raw]
+        else:
+            attrs = [self.d_key.join((key, val.join((self.d_quotes, self.d_quotes)))) for key, val in attr.items()]
         if self.comments and comment:
             attrs.append(comment)
         cols = cols + [self.d_attribute.join(attrs)]
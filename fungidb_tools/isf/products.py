@@ -0,0 +1,156 @@
+"""Extract product names for InsertGeneFeatProductFromTabFile.
+
+genbank_products reads the RNA features of a GenBank file.  For a regular
+file, genbank_products_parallel scans byte ranges of whole records in
+worker processes and yields the same rows in file order.
+
+    with open('genome.gbf', 'rb') as infile:
+        for locus, product in genbank_products(infile, ['product']):
+            print(locus, product)
+
+tsv_products reads chosen columns from a tab-separated summary (JGI KOG
+tables, Broad gene lists) by their header names.  Each line is split only
+as far as the last column needed, and repeats are found with a dict of the
+ids seen, so rows need not be adjacent to be dropped.
+
+    for row in tsv_products(infile, 'transcriptId', ['kogdefline'],
+                            prefix='ncra', unique=True):
+        outfile.write('\t'.join(row) + '\n')
+"""
+from __future__ import absolute_import, unicode_literals
+from operator import itemgetter
+from warnings import warn
+import io
+import os
+import warnings
+from fungidb_tools.gff.ParallelRanges import (
+    RANGES_PER_JOB, RangeReader, ordered_map)
+from .genbank import scan_records, split_records
+
+
+def is_rna(key):
+    return key.endswith('RNA')
+
+
+def genbank_products(infile, qualifiers, offset=0):
+    """Yield (locus, product) pairs from the RNA features of a GenBank file.
+
+    Args:
+        infile: A filestream to read from.
+        qualifiers: feature qualifiers that hold product names.
+        offset: file offset infile starts at.
+    """
+    for record in scan_records(infile, keep=is_rna, offset=offset):
+        for feature in record.features:
+            try:
+                locus = feature.qualifiers['locus_tag']
+            except KeyError:
+                continue
+            products = set()
+            for q in qualifiers:
+                try:
+                    f = feature.qualifiers[q]
+                except KeyError:
+                    continue
+                products |= set(qual for qual in f if qual not in locus)
+            if not products:
+                warn("%s missing product" % locus)
+                continue
+            if len(locus) > 1:
+                warn("Locus has more than one element {}".format(locus))
+            elif len(products) > 1:
+                warn("Product has more than one element {}".format(products))
+            yield ','.join(locus), ','.join(products)
+
+
+def _genbank_range(task):
+    path, start, end, qualifiers = task
+    # Warnings are passed back so the parent can report them in file order.
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        with io.open(path, 'rb') as infile:
+            rows = list(genbank_products(RangeReader(infile, start, end),
+                                         qualifiers, start))
+    return rows, [str(w.message) for w in caught]
+
+
+def genbank_products_parallel(path, qualifiers, jobs=None):
+    """Yield genbank_products' rows, scanning on a pool of processes.
+
+    The rows come out in file order.  Warnings from the workers are held
+    back and issued together, in file order, once every row is out.
+
+    Args:
+        path: GenBank file (must be a regular, uncompressed file).
+        qualifiers: feature qualifiers that hold product names.
+        jobs: number of worker processes (defaults to the CPU count).
+    """
+    jobs = jobs or os.cpu_count() or 1
+    tasks = [(path, start, end, qualifiers)
+             for start, end in split_records(path, jobs * RANGES_PER_JOB)]
+
+    messages = []
+    for rows, piece_messages in ordered_map(_genbank_range, tasks, jobs):
+        messages.extend(piece_messages)
+        for row in rows:
+            yield row
+    for message in messages:
+        warn(message)
+
+
+class ColumnError(Exception):
+    pass
+
+
+def tsv_columns(header, id, save):
+    """Return the indices of the id column and the save columns, in order.
+
+    Args:
+        header: the header line; a leading # is ignored.
+        id: header of the id column.
+        save: headers of the columns to save.
+    """
+    names = header.rstrip('\r\n').lstrip('#').split('\t')
+    columns = {}
+    for i, name in enumerate(names):
+        columns.setdefault(name, i)
+    try:
+        return columns[id], [columns[name] for name in save]
+    except KeyError as e:
+        raise ColumnError("No {} column in the header".format(e))
+
+
+def tsv_products(infile, id, save, prefix=None, unique=False):
+    """Yield (id, save...) tuples from a tab-separated file with a header.
+
+    Args:
+        infile: text stream whose first line is the header.
+        id: header of the id column.
+        save: headers of the columns to save.
+        prefix: joined to each id with an underscore.
+        unique: skip rows already seen anywhere in the file, and warn about
+            ids seen again with different values.
+    """
+    id_col, save_cols = tsv_columns(next(infile), id, save)
+    get = itemgetter(id_col, *save_cols)
+    # Columns after the last one needed are left unsplit.
+    maxsplit = max(id_col, *save_cols) + 1
+    # The first row of each id; other rows for ids with several values.
+    first = {}
+    repeated = set()
+    for line in infile:
+        fields = line.rstrip('\r\n').split('\t', maxsplit)
+        if len(fields) == 1 and not fields[0]:
+            continue
+        row = get(fields)
+        if unique:
+            seen = first.setdefault(row[0], row)
+            if seen is not row:
+                if seen == row or row in repeated:
+                    continue
+                repeated.add(row)
+                new_id = '_'.join((prefix, row[0])) if prefix else row[0]
+                warn('Non-unique key: {}'.format(new_id))
+        if prefix:
+            row = ('_'.join((prefix, row[0])),) + row[1:]
+        yield row
@@ -9,11 +9,13 @@ Edward Liaw
 
 """
 from __future__ import absolute_import, unicode_literals
-from future.builtins import zip, int
+from future.builtins import str, zip, int
 import re
 from . import roman
 
 RE_DEFAULT = (r'Chr_(?:(?P<number>\d+)|(?:P<roman>[XIV]+)|(?P<letter>[A-Z]))',)
+# Chromosome field of a renamed contig (e.g. ncra_Chr01, ncra_ChrIV).
+RE_CHROMOSOME = (r'_(?:Chr|SC|LG)(?:(?P<number>\d+)|(?P<roman>[XIV]+)|(?P<letter>\S+))$',)
 
 
 class NoMatchException(Exception):
@@ -23,9 +25,39 @@ class NoMatchException(Exception):
     pass
 
 
+R_GROUP_NAME = re.compile(r'\(\?P([<=])(\w+)')
+R_BACKREF = re.compile(r'\\[1-9]')
+
+
+def combine_regex(patterns):
+    """Merge patterns into one regex that tries them in order.
+
+    Each pattern becomes a branch named _b<i>, with its own groups renamed
+    to _b<i>_<name>.  The lazy prefix makes every branch search the whole
+    string before the next is tried, as separate searches would.  Return
+    None if the patterns can't be merged (numbered backreferences, inline
+    flags).
+    """
+    branches = []
+    for i, rx in enumerate(patterns):
+        if R_BACKREF.search(rx):
+            return None
+        rx = R_GROUP_NAME.sub(
+            lambda m: '(?P{}_b{}_{}'.format(m.group(1), i, m.group(2)), rx)
+        branches.append('.*?(?P<_b{}>{})'.format(i, rx))
+    try:
+        return re.compile('^(?:{})'.format('|'.join(branches)), re.DOTALL)
+    except re.error:
+        return None
+
+
 class ContigRenamer(object):
 
-    """Customizable renaming of contigs."""
+    """Customizable renaming of contigs.
+
+    Results, including misses, are cached per input name, since the same
+    few contigs are renamed once per line.
+    """
 
     def __init__(self, abbrev, padding, soterm, regex):
         self.abbrev = abbrev
@@ -35,6 +67,8 @@ class ContigRenamer(object):
             "Every regular expression should be provided a SO term"
         self.soterm = soterm
         self.regex = [re.compile(rx) for rx in regex]
+        self.combined = combine_regex(regex)
+        self.cache = {}
 
     @classmethod
     def from_args(cls, args):
@@ -44,31 +78,167 @@ class ContigRenamer(object):
     def _format_number(self, number):
         return self.padding.format(int(number))
 
+    def _match(self, target):
+        """Return (index of the first matching regex, field dict) or None."""
+        if self.combined is None:
+            for i, rx in enumerate(self.regex):
+                match = rx.search(target)
+                if match is not None:
+                    return i, match.groupdict()
+            return None
+        match = self.combined.match(target)
+        if match is None:
+            return None
+        i = int(match.lastgroup[2:])
+        prefix = '_b{}_'.format(i)
+        fields = dict((name[len(prefix):], value)
+                      for name, value in match.groupdict().items()
+                      if name.startswith(prefix))
+        return i, fields
+
+    def _rename(self, target):
+        found = self._match(target)
+        if found is None:
+            return None
+        i, match = found
+        rx, so = self.regex[i], self.soterm[i]
+        number = match.get('number', None)
+        roman_num = match.get('roman', None)
+        letter = match.get('letter', None)
+        if number is not None:
+            contig = self._format_number(number)
+        elif roman_num is not None:
+            if roman_num.isdigit():
+                contig = roman.roman_from_int(int(roman_num))
+            else:
+                contig = roman_num
+        elif letter is not None:
+            contig = letter.upper()
+        else:
+            raise Exception("Regex {} doesn't contain a number, letter, "
+                            "or roman numeral field.".format(rx.pattern))
+        return "{}_{}{}".format(self.abbrev, so, contig)
+
     def rename(self, target):
         """Return renamed contig line."""
-        for rx, so in zip(self.regex, self.soterm):
-            match = rx.search(target)
-            if match is None:
+        try:
+            contig = self.cache[target]
+        except KeyError:
+            contig = self.cache[target] = self._rename(target)
+        if contig is None:
+            raise NoMatchException("Doesn't match any regular expression: "
+                                   "{}".format(target))
+        return contig
+
+    def rename_many(self, targets):
+        """Return a dict of new names for the targets that match."""
+        table = {}
+        for target in targets:
+            try:
+                table[target] = self.rename(target)
+            except NoMatchException:
+                pass
+        return table
+
+
+def chromosome_number(name, regex=RE_CHROMOSOME):
+    """Return the chromosome number (or letter) in a contig name.
+
+    Raises NoMatchException if none of the regexes match.
+    """
+    for rx in regex:
+        match = re.search(rx, name)
+        if match is None:
+            continue
+        match = match.groupdict()
+        number = match.get('number')
+        roman_num = match.get('roman')
+        letter = match.get('letter')
+        if number is not None:
+            return int(number)
+        elif roman_num is not None:
+            return roman.int_from_roman(roman_num)
+        elif letter is not None:
+            return letter
+        else:
+            raise Exception("Regex {} doesn't contain a number, letter, or "
+                            "roman numeral field.".format(rx))
+    raise NoMatchException("Not an expected header format: {}".format(name))
+
+
+class ContigMap(object):
+
+    """Contig renaming worked out once, while formatting the genome FASTA.
+
+    The map is saved next to the formatted FASTA so that the GFF step can
+    rename by lookup, and the chromosome map can be written without reading
+    the FASTA again.
+
+    Attributes:
+        entries (String, String, String) List: old name, new name and
+            chromosome ('.' if none) in FASTA order.
+        names String String Dict: new name by old name.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.names = {}
+
+    def add(self, old, new):
+        try:
+            chromosome = str(chromosome_number(new))
+        except NoMatchException:
+            chromosome = '.'
+        self.entries.append((old, new, chromosome))
+        self.names[old] = new
+
+    def rename(self, target):
+        """Return the new name, as ContigRenamer.rename would."""
+        try:
+            return self.names[target]
+        except KeyError:
+            raise NoMatchException("Not in the contig map: {}".format(target))
+
+    def rename_many(self, targets):
+        return dict((t, self.names[t]) for t in targets if t in self.names)
+
+    def save(self, outfile):
+        """Write old name, new name, chromosome and order, tab-separated."""
+        for order, (old, new, chromosome) in enumerate(self.entries, 1):
+            outfile.write('\t'.join((old, new, chromosome, str(order))) + '\n')
+
+    @classmethod
+    def load(cls, infile):
+        contigs = cls()
+        for line in infile:
+            if not line.strip() or line.startswith('#'):
                 continue
-            match = match.groupdict()
-            number = match.get('number', None)
-            roman_num = match.get('roman', None)
-            letter = match.get('letter', None)
-            if number is not None:
-                contig = self._format_number(number)
-            elif roman_num is not None:
-                if roman_num.isdigit():
-                    contig = roman.roman_from_int(int(roman_num))
-                else:
-                    contig = roman_num
-            elif letter is not None:
-                contig = letter.upper()
-            else:
-                raise Exception("Regex {} doesn't contain a number, letter, "
-                                "or roman numeral field.".format(rx.pattern))
-            return "{}_{}{}".format(self.abbrev, so, contig)
-        raise NoMatchException("Doesn't match any regular expression: "
-                               "{}".format(target))
+            old, new, chromosome, order = line.rstrip('\n').split('\t')
+            contigs.entries.append((old, new, chromosome))
+            contigs.names[old] = new
+        return contigs
+
+    def write_chromosome_map(self, outfile, regex=None):
+        """Write the chromosomeMap.txt lines gen_fasta_chr_map would.
+
+        Args:
+            regex: read the chromosomes from the new names with these
+                regexes, instead of using the ones saved in the map.
+        """
+        for order, (old, new, chromosome) in enumerate(self.entries, 1):
+            if regex is not None:
+                chromosome = str(chromosome_number(new, regex))
+            elif chromosome == '.':
+                raise NoMatchException("No chromosome in {}".format(new))
+            outfile.write('\t'.join((new, chromosome, str(order))) + '\n')
+
+
+def renamer_from_args(args):
+    """Return a ContigMap if --contig-map is given, else a ContigRenamer."""
+    if getattr(args, 'contig_map', None):
+        with open(args.contig_map) as infile:
+            return ContigMap.load(infile)
+    return ContigRenamer.from_args(args)
 
 
 def add_rename_args(parser):
@@ -85,3 +255,7 @@ def add_rename_args(parser):
     parser.add_argument('--regex',
                         nargs='*', default=RE_DEFAULT,
                         help='regular expressions matching contig identifiers')
+    parser.add_argument('--contig-map',
+                        metavar='FILE',
+                        help='rename from a map written by format_fasta '
+                             'instead of the regular expressions')
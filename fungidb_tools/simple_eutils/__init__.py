@@ -1 +1,3 @@
 from .simple_eutils import RetryException, retry, webenv_post, webenv_search, webenv_link, idlist_search, idlist_link, etree_summary, etree_fetch
+from .simple_eutils import set_cache
+from .response_cache import ResponseCache, CacheMiss, add_cache_args
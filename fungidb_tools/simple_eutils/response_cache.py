@@ -0,0 +1,165 @@
+"""SQLite cache of raw eutils responses.
+
+Responses are stored as the XML bytes NCBI returned, keyed by the eutils
+function and its parameters (db, ids or term, linkname...).  Entries older
+than the TTL are fetched again, and the least recently used are dropped
+once the file grows past its size limit.  In offline mode nothing is
+fetched: stored responses are served however old they are, and anything
+else raises CacheMiss.
+
+    from fungidb_tools import simple_eutils as eutils
+
+    eutils.set_cache(eutils.ResponseCache('~/.cache/fungidb_tools/eutils.db'))
+    root = eutils.etree_fetch('taxonomy', id=['5141'])
+
+Session history requests (webenv/query_key) are never cached, since the
+sessions expire on NCBI's side.
+"""
+from __future__ import print_function, unicode_literals
+import hashlib
+import os
+import sqlite3
+import time
+
+# Bump when the key or table layout changes.
+CACHE_VERSION = 1
+DEFAULT_TTL = 7 * 24
+DEFAULT_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def _param(value):
+    """Return a parameter as Entrez sends it (lists of ids comma-joined)."""
+    if isinstance(value, (str, bytes, int, float)):
+        return str(value)
+    return ','.join(str(v) for v in value)
+
+
+def request_repr(function, params):
+    """Return a stable description of an eutils request."""
+    parts = sorted((k, _param(v)) for k, v in params.items()
+                   if v is not None)
+    return repr((CACHE_VERSION, function, parts))
+
+
+class ResponseCache(object):
+
+    """Single-file store of eutils responses.
+
+    Attributes:
+        path String: the SQLite file.
+        ttl Float: seconds before a response is fetched again.
+        max_size Int: total response bytes the file is trimmed to.
+        offline Bool: serve only from the cache.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL * 3600,
+                 max_size=DEFAULT_SIZE << 20, offline=False):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(self.path)
+        self._db.executescript(SCHEMA)
+
+    @classmethod
+    def from_args(cls, args):
+        """Return a ResponseCache for the --cache options, or None if unset."""
+        if not args.cache:
+            return None
+        return cls(args.cache, args.cache_ttl * 3600, args.cache_size << 20,
+                   args.offline)
+
+    @staticmethod
+    def key(function, params):
+        request = request_repr(function, params)
+        return hashlib.sha1(request.encode('utf-8')).hexdigest(), request
+
+    def get(self, function, params):
+        """Return the stored response bytes, or None if missing or expired."""
+        key, _ = self.key(function, params)
+        row = self._db.execute(
+            'SELECT data, created FROM responses WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            return None
+        data, created = row
+        now = time.time()
+        if not self.offline and now - created > self.ttl:
+            return None
+        with self._db:
+            self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?',
+                             (now, key))
+        return bytes(data)
+
+    def put(self, function, params, data):
+        key, request = self.key(function, params)
+        now = time.time()
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (key, request, sqlite3.Binary(data), len(data), now, now))
+        self.trim()
+
+    def trim(self):
+        """Drop expired responses, then the least recently used until under
+        max_size."""
+        with self._db:
+            self._db.execute('DELETE FROM responses WHERE created < ?',
+                             (time.time() - self.ttl,))
+            total = self._db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total <= self.max_size:
+                return
+            rows = self._db.execute(
+                'SELECT key, size FROM responses ORDER BY accessed').fetchall()
+            drop = []
+            for key, size in rows:
+                if total <= self.max_size:
+                    break
+                drop.append((key,))
+                total -= size
+            self._db.executemany('DELETE FROM responses WHERE key = ?', drop)
+
+    def clear(self):
+        with self._db:
+            self._db.execute('DELETE FROM responses')
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+def add_cache_args(parser):
+    parser.add_argument('--cache',
+                        metavar='FILE',
+                        help='cache NCBI responses in this SQLite file')
+    parser.add_argument('--cache-ttl',
+                        type=float, default=DEFAULT_TTL, metavar='HOURS',
+                        help='fetch cached responses again after this long')
+    parser.add_argument('--cache-size',
+                        type=int, default=DEFAULT_SIZE, metavar='MB',
+                        help='trim the cache to this size')
+    parser.add_argument('--offline',
+                        action='store_true',
+                        help='only use responses from the --cache file')
@@ -12,6 +12,9 @@ Two use-cases for esearch and elink:
 
 Efetch and esummary results are parsed into an ElementTree for easier indexing.
 
+Searches, links, fetches and summaries by id or term are read from a
+ResponseCache when one is set with set_cache (see response_cache).
+
 
 Example use for quickly chaining together queries:
 
@@ -27,10 +30,12 @@ Example use for quickly chaining together queries:
 Edward Liaw
 """
 from __future__ import print_function
+import io
 import sys
 import time
 from decorator import decorator
 from Bio import Entrez
+from .response_cache import CacheMiss
 
 try:
     from lxml import etree
@@ -44,6 +49,7 @@ except ImportError:
 
 
 Entrez.email = "ed.liaw@fungidb.org"
+_cache = None
 
 
 class RetryException(Exception):
@@ -56,8 +62,8 @@ def _retry(func, *args, **kwargs):
     for x in range(func.attempts - 1):
         try:
             return func(*args, **kwargs)
-        except AssertionError as e:
-            # Allow debug error messages to raise.
+        except (AssertionError, CacheMiss) as e:
+            # Allow debug error messages (and offline misses) to raise.
             raise e
         except Exception as e:
             # Handle errors.
@@ -67,6 +73,8 @@ def _retry(func, *args, **kwargs):
             my_delay *= func.backoff  # Exponentially increase the delay.
     try:
         return func(*args, **kwargs)
+    except CacheMiss:
+        raise
     except:
         # Final error message.
         raise RetryException("%d retries failed." % func.attempts)
@@ -80,6 +88,38 @@ def retry(f, attempts=3, delay=3, backoff=2):
     return decorator(_retry, f)
 
 
+def set_cache(cache):
+    """Read responses through a ResponseCache (None to stop caching)."""
+    global _cache
+    _cache = cache
+
+
+def _request(function, **params):
+    """Call an Entrez function, going through the cache if one is set.
+
+    Session history requests are passed straight through.
+
+    Returns:
+        A handle on the response.
+    """
+    cache = _cache
+    if cache is None or params.get('webenv') is not None:
+        return getattr(Entrez, function)(**params)
+    data = cache.get(function, params)
+    if data is None:
+        if cache.offline:
+            raise CacheMiss("%s %r is not in the cache." % (function, params))
+        handle = getattr(Entrez, function)(**params)
+        try:
+            data = handle.read()
+        finally:
+            handle.close()
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        cache.put(function, params, data)
+    return io.BytesIO(data)
+
+
 @retry
 def webenv_post(db, id):
     """Get the webenv key from an epost (handles large lists of ids that may
@@ -192,18 +232,21 @@ def idlist_search(db, term=None, field=None, webenv=None, query_key=None,
     ids = []
     start = 0
     count = None
+    # A term search is paged by term alone, so each page can be cached.
+    usehistory = 'y' if webenv is not None else None
     while count is None or count > start:
-        search_handle = Entrez.esearch(db=db, term=term, field=field,
-                                       retstart=start, retmax=retmax,
-                                       webenv=webenv, query_key=query_key,
-                                       usehistory='y')
+        search_handle = _request('esearch', db=db, term=term, field=field,
+                                 retstart=start, retmax=retmax,
+                                 webenv=webenv, query_key=query_key,
+                                 usehistory=usehistory)
         et = etree.parse(search_handle)
         search_handle.close()
 
         root = et.getroot()
         count = int(root.find('Count').text)
-        webenv = root.find('WebEnv').text
-        query_key = root.find('QueryKey').text
+        if usehistory:
+            webenv = root.find('WebEnv').text
+            query_key = root.find('QueryKey').text
         ids += [id.text for id in root.findall('IdList/Id')]
         start += retmax
     return ids
@@ -228,13 +271,14 @@ def idlist_link(db, dbfrom, id=None, webenv=None, query_key=None, linkname=None)
         List of ids.
     """
     if id is None:
-        link_handle = Entrez.elink(db=db, dbfrom=dbfrom, linkname=linkname,
-                                   webenv=webenv, query_key=query_key)
+        link_handle = _request('elink', db=db, dbfrom=dbfrom,
+                               linkname=linkname, webenv=webenv,
+                               query_key=query_key)
     else:
         if isinstance(id, list):
             id = ','.join(id)
-        link_handle = Entrez.elink(db=db, dbfrom=dbfrom, id=id,
-                                   linkname=linkname)
+        link_handle = _request('elink', db=db, dbfrom=dbfrom, id=id,
+                               linkname=linkname)
 
     et = etree.parse(link_handle)
     link_handle.close()
@@ -258,12 +302,12 @@ def etree_summary(db, id=None, webenv=None, query_key=None, out=None):
         ElementTree of results.
     """
     if id is None:
-        summary_handle = Entrez.esummary(db=db, webenv=webenv,
-                                         query_key=query_key)
+        summary_handle = _request('esummary', db=db, webenv=webenv,
+                                  query_key=query_key)
     else:
         if isinstance(id, list):
             id = ','.join(id)
-        summary_handle = Entrez.esummary(db=db, id=id)
+        summary_handle = _request('esummary', db=db, id=id)
 
     et = etree.parse(summary_handle)
     summary_handle.close()
@@ -289,11 +333,12 @@ def etree_fetch(db, id=None, webenv=None, query_key=None, out=None):
         ElementTree of results.
     """
     if id is None:
-        fetch_handle = Entrez.efetch(db=db, webenv=webenv, query_key=query_key)
+        fetch_handle = _request('efetch', db=db, webenv=webenv,
+                                query_key=query_key)
     else:
         if isinstance(id, list):
             id = ','.join(id)
-        fetch_handle = Entrez.efetch(db=db, id=id)
+        fetch_handle = _request('efetch', db=db, id=id)
 
     et = etree.parse(fetch_handle)
     fetch_handle.close()
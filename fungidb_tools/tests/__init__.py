@@ -0,0 +1,6 @@
+"""Tests for fungidb_tools.
+
+Run with `python setup.py test` or `python -m unittest discover`.  The
+benchmarks in fungidb_tools.tests.benchmark print their numbers with
+`python -m fungidb_tools.tests.benchmark`.
+"""
@@ -0,0 +1,199 @@
+"""Benchmarks for the GFF parsers.
+
+    python -m fungidb_tools.tests.benchmark
+
+scaling: seconds to nest a file whose rows are shuffled (children mostly
+before their parents), at growing sizes.  The old rescan approach is timed
+alongside up to the size where it gets slow.
+
+memory: bytes held per row once a file is parsed, against copies of the
+plain __dict__ classes the parsers built before __slots__.  The rows carry
+a Name, product and Note besides the IDs, as annotated files do.
+"""
+
+from __future__ import print_function, unicode_literals
+import io
+import re
+import time
+import tracemalloc
+import urllib.parse
+from collections import OrderedDict
+from fungidb_tools.gff import GFF2Parser as g2
+from fungidb_tools.gff import GFF3Parser as gp
+from fungidb_tools.isf import parse_gff
+from fungidb_tools.tests.synthetic import gff3_lines, gtf_lines
+from fungidb_tools.tests.test_gff3_parser import rescan_tiers
+
+SCALING_SIZES = (1000, 2000, 4000, 8000, 16000)
+RESCAN_LIMIT = 2000
+MEMORY_GENES = 2000
+
+
+def time_parse(lines, repeat=3):
+    """Return the best time of GFF3Parser.parse over lines."""
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for _ in gp.GFF3Parser().parse(lines):
+            pass
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_rescan(lines):
+    feats = [f for f in gp.GFF3Parser().parse_flat(lines)
+             if isinstance(f, gp.GFF3Feature)]
+    t = time.perf_counter()
+    rescan_tiers(feats)
+    return time.perf_counter() - t
+
+
+def scaling(sizes=SCALING_SIZES, rescan_limit=RESCAN_LIMIT):
+    """Yield (genes, rows, parse seconds, rescan seconds or None)."""
+    for genes in sizes:
+        lines = gff3_lines(genes, shuffle='file')
+        rescan = time_rescan(lines) if genes <= rescan_limit else None
+        yield genes, len(lines) - 1, time_parse(lines), rescan
+
+
+class OldGFF2Feature(object):
+    def __init__(self, seqid, source, feature, start, end, score, strand,
+                 phase, attributes, comment):
+        self.seqid = seqid
+        self.source = source
+        self.feature = feature
+        self.start = start
+        self.end = end
+        self.score = score
+        self.strand = strand
+        self.phase = phase
+        self.attributes = attributes
+        self.comment = comment
+
+
+class OldRegion(object):
+    def __init__(self, seqid, start, end, score, strand, phase, attributes):
+        self.seqid = seqid
+        self.start = start
+        self.end = end
+        self.score = score
+        self.strand = strand
+        self.phase = phase
+        self.attributes = attributes
+
+
+class OldGFF3Feature(object):
+    def __init__(self, seqid, source, soterm, id, parents, regions):
+        self.seqid = seqid
+        self.source = source
+        self.soterm = soterm
+        self.id = id
+        self.parents = set(parents) if parents else set()
+        self.regions = regions
+        self.children = set()
+
+
+class OldFeature(object):
+    def __init__(self, seqid, source, soterm, pos, score, strand, phase,
+                 attr, comment, children):
+        self.seqid = seqid
+        self.source = source
+        self.soterm = soterm
+        self.pos = pos
+        self.score = score
+        self.strand = strand
+        self.phase = phase
+        self.attr = attr
+        self.comment = comment
+        self.children = children
+
+
+R_ATTR_TOKENS = re.compile(r';|#.*|"[^"]*"|[^";\s]+')
+
+
+def old_gff2(lines):
+    for line in lines:
+        cols = line.split('\t', 8)
+        attributes = OrderedDict()
+        values = []
+        for t in R_ATTR_TOKENS.findall(cols.pop()) + [';']:
+            if t == ';' and values:
+                attributes[values.pop(0)] = values
+                values = []
+            elif t != ';':
+                values.append(t)
+        yield OldGFF2Feature(*cols, attributes=attributes, comment=None)
+
+
+def old_gff3(lines):
+    for line in lines:
+        seqid, source, soterm, start, end, score, strand, phase, attr = \
+            line.split('\t')
+        attr = OrderedDict((k, v.split(','))
+                           for k, v in (a.split('=', 1) for a in attr.split(';')))
+        id = attr.pop('ID', [None]).pop()
+        regions = [OldRegion(seqid, start, end, score, strand, phase, attr)]
+        yield OldGFF3Feature(seqid, source, soterm, id, attr.pop('Parent', None),
+                             regions)
+
+
+def old_parse_gff(lines, filetype):
+    d_key, d_quotes = ('=', '') if filetype == 'gff3' else (' ', '"')
+    for line in lines:
+        cols = line.split('\t')
+        attr = OrderedDict()
+        for pair in cols.pop().rstrip(';').split(';'):
+            key, val = pair.strip().split(d_key, 2)
+            attr[key] = urllib.parse.quote(
+                urllib.parse.unquote(val.strip(d_quotes)))
+        seqid, source, soterm, start, end, score, strand, phase = cols
+        yield OldFeature(seqid, source, soterm, [(start, end)], score, strand,
+                         phase, attr, '', [])
+
+
+def bytes_per_row(parse, lines):
+    """Return the bytes still allocated per row once parse(lines) is held."""
+    tracemalloc.start()
+    try:
+        held = list(parse(lines))
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del held
+    return size / len(lines)
+
+
+def memory(genes=MEMORY_GENES):
+    """Yield (parser, old bytes per row, new bytes per row)."""
+    gff3 = gff3_lines(genes, annotated=True)[1:]
+    gtf = gtf_lines(genes, annotated=True)
+    yield ('GFF3Parser.parse_flat', bytes_per_row(old_gff3, gff3),
+           bytes_per_row(gp.GFF3Parser().parse_flat, gff3))
+    yield ('GFF2Parser.parse', bytes_per_row(old_gff2, gtf),
+           bytes_per_row(g2.GFF2Parser().parse, gtf))
+    for filetype, lines in (('gtf', gtf), ('gff3', gff3)):
+        parser = parse_gff.GFFParser(filetype)
+        yield ('parse_gff.parse ' + filetype,
+               bytes_per_row(lambda l: old_parse_gff(l, filetype), lines),
+               bytes_per_row(lambda l: parser.parse(l, io.StringIO()), lines))
+
+
+def main():
+    print('scaling (rows shuffled across the file)')
+    print('{:>8} {:>8} {:>10} {:>10} {:>10}'.format(
+        'genes', 'rows', 'parse s', 'us/row', 'rescan s'))
+    for genes, rows, parse, rescan in scaling():
+        print('{:>8} {:>8} {:>10.3f} {:>10.2f} {:>10}'.format(
+            genes, rows, parse, parse / rows * 1e6,
+            '-' if rescan is None else '{:.3f}'.format(rescan)))
+    print()
+    print('memory (bytes per row held)')
+    print('{:<24} {:>8} {:>8} {:>8}'.format('parser', 'old', 'new', 'ratio'))
+    for name, old, new in memory():
+        print('{:<24} {:>8.0f} {:>8.0f} {:>8.1f}'.format(
+            name, old, new, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Synthetic GFF3 annotation for the tests and benchmarks."""
+
+from __future__ import print_function, unicode_literals
+import random
+
+GENE_SPACING = 1000
+# Attributes beyond ID and Parent, as annotated files carry them.
+GFF3_ANNOTATION = ';Name={};product=hypothetical protein;Note=predicted%2C v1'
+GTF_ANNOTATION = ' product "hypothetical_protein"; note "predicted,v1";'
+
+
+def gene_rows(gene, seqid, start, exons=2, annotated=False):
+    """Return the rows of one gene: gene, mRNA, then exons and CDSs.
+
+    The CDS is written on several rows sharing one ID, one per exon.  With
+    annotated, each row also has a Name, product and Note.
+    """
+    name = '{}_g{}'.format(seqid, gene)
+    end = start + 200 * exons - 1
+    rows = [
+        (seqid, 'test', 'gene', start, end, 'ID={}'.format(name)),
+        (seqid, 'test', 'mRNA', start, end,
+         'ID={0}.t;Parent={0}'.format(name)),
+    ]
+    for i in range(exons):
+        a = start + 200 * i
+        rows.append((seqid, 'test', 'exon', a, a + 99,
+                     'ID={0}.e{1};Parent={0}.t'.format(name, i)))
+    for i in range(exons):
+        a = start + 200 * i
+        rows.append((seqid, 'test', 'CDS', a, a + 99,
+                     'ID={0}.c;Parent={0}.t'.format(name)))
+    if annotated:
+        rows = [row[:5] + (row[5] + GFF3_ANNOTATION.format(
+            row[5].split(';')[0][3:]),) for row in rows]
+    return rows
+
+
+def format_row(row):
+    seqid, source, soterm, start, end, attributes = row
+    return '\t'.join((seqid, source, soterm, str(start), str(end), '.', '+',
+                      '.', attributes))
+
+
+def gff3_lines(genes, contigs=('ctgA', 'ctgB'), exons=2, shuffle=None,
+               seed=0, annotated=False):
+    """Return the lines of a GFF3 file, genes split evenly between contigs.
+
+    Args:
+        shuffle: None for sorted rows, 'contig' to shuffle the rows within
+            each contig, or 'file' to shuffle every row.
+        annotated: give each row a Name, product and Note.
+    """
+    rng = random.Random(seed)
+    per_contig = []
+    for c, seqid in enumerate(contigs):
+        rows = []
+        for gene in range(c, genes, len(contigs)):
+            rows += gene_rows(gene, seqid, 1 + gene * GENE_SPACING, exons,
+                              annotated)
+        if shuffle == 'contig':
+            rng.shuffle(rows)
+        per_contig.append(rows)
+    rows = [row for contig in per_contig for row in contig]
+    if shuffle == 'file':
+        rng.shuffle(rows)
+    return ['##gff-version 3'] + [format_row(row) for row in rows]
+
+
+def tree(feat):
+    """Return a comparable (id, type, regions, children) nesting of a tree."""
+    regions = tuple(sorted((r.seqid, r.start, r.end) for r in feat.regions))
+    children = tuple(sorted(tree(c) for c in feat.children))
+    return feat.id, feat.soterm, regions, children
+
+
+def gtf_lines(genes, contigs=('ctgA', 'ctgB'), exons=2, annotated=False):
+    """Return the lines of a GTF file of the same genes as gff3_lines."""
+    lines = []
+    for c, seqid in enumerate(contigs):
+        for gene in range(c, genes, len(contigs)):
+            start = 1 + gene * GENE_SPACING
+            name = '{}_g{}'.format(seqid, gene)
+            attributes = ('gene_id "{0}"; transcript_id "{0}.t"; '
+                          'gene_name "{0}";'.format(name))
+            if annotated:
+                attributes += GTF_ANNOTATION
+            for i in range(exons):
+                a = start + 200 * i
+                for soterm in ('exon', 'CDS'):
+                    lines.append('\t'.join((seqid, 'test', soterm, str(a),
+                                            str(a + 99), '.', '+', '0',
+                                            attributes)))
+    return lines
@@ -0,0 +1,96 @@
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+from fungidb_tools.gff import GFF3Parser as gp
+from fungidb_tools.tests.synthetic import gff3_lines, gtf_lines
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+else:
+    from fungidb_tools.gff.Columnar import parse_columnar
+
+
+@unittest.skipIf(numpy is None, "needs numpy")
+class ColumnarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, lines, name='t.gff3'):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as outfile:
+            outfile.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_columns(self):
+        lines = gff3_lines(10, shuffle='file')
+        cols = parse_columnar(self.write(lines + ['##FASTA', '>ctgA',
+                                                  'ACGT']))
+        rows = [f for f in gp.GFF3Parser().parse_flat(lines)
+                if isinstance(f, gp.GFF3Feature)]
+        self.assertEqual(len(cols), len(rows))
+        for i, f in enumerate(rows):
+            region = f.regions[0]
+            self.assertEqual(cols.seqids[cols.seqid[i]], f.seqid)
+            self.assertEqual(cols.soterms[cols.soterm[i]], f.soterm)
+            self.assertEqual((cols.start[i], cols.end[i]),
+                             (region.start, region.end))
+            self.assertEqual(cols.strand[i], 1)
+            self.assertEqual(cols.phase[i], -1)
+            self.assertEqual(cols.line(i), lines[i + 1])
+        self.assertEqual(cols.attributes(0), gp.parse_attributes(
+            lines[1].split('\t')[8]))
+        self.assertEqual(cols.code('soterm', 'missing'), -1)
+
+    def test_order_and_overlaps(self):
+        lines = gff3_lines(10, shuffle='file')
+        cols = parse_columnar(self.write(lines))
+        keys = [(cols.seqids[cols.seqid[i]], cols.start[i], cols.end[i])
+                for i in range(len(cols))]
+        self.assertEqual([keys[i] for i in cols.order()], sorted(keys))
+
+        i, j = cols.overlap_pairs()
+        got = sorted(tuple(sorted(pair)) for pair in zip(i, j))
+        expected = sorted((a, b) for a in range(len(keys))
+                          for b in range(a + 1, len(keys))
+                          if keys[a][0] == keys[b][0] and
+                          keys[a][1] <= keys[b][2] and
+                          keys[b][1] <= keys[a][2])
+        self.assertEqual(got, expected)
+
+        mask = cols.overlapping('ctgB', 1001, 1001)
+        genes = cols.take(mask)
+        self.assertEqual(sorted(genes.soterms[c] for c in genes.soterm),
+                         ['CDS', 'exon', 'gene', 'mRNA'])
+
+    def test_gtf_attributes(self):
+        lines = gtf_lines(2)
+        cols = parse_columnar(self.write(lines, 't.gtf'), 'gtf')
+        self.assertEqual(cols.attributes(0)['gene_id'], ('"ctgA_g0"',))
+        self.assertEqual(cols.phase[0], 0)
+
+    def test_missing_attributes_column(self):
+        cols = parse_columnar(self.write([
+            'ctgA\tt\tgene\t1\t10\t.\t-\t.',
+            'ctgA\tt\tgene\t5\t20\t.\t+\t.\tID=g2']))
+        self.assertEqual(len(cols), 2)
+        self.assertEqual(cols.strand[0], -1)
+        self.assertEqual(cols.raw_attributes(0), '')
+        self.assertEqual(cols.attributes(0), {})
+        self.assertEqual(cols.attributes(1), {'ID': ('g2',)})
+
+    def test_short_row(self):
+        path = self.write(['ctgA\tt\tgene\t1\t10\t.\t+'])
+        with self.assertRaises(gp.ParseError):
+            parse_columnar(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
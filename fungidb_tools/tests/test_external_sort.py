@@ -0,0 +1,25 @@
+from __future__ import print_function, unicode_literals
+import unittest
+from fungidb_tools.gff.ExternalSort import ExternalSort
+
+
+class ExternalSortTest(unittest.TestCase):
+
+    def sort(self, items, run_size):
+        runs = ExternalSort(key=lambda item: item[0], run_size=run_size)
+        runs.extend(items)
+        return list(runs)
+
+    def test_sorted(self):
+        items = [(i * 7 % 10, i) for i in range(10)]
+        for run_size in (1, 3, 100):
+            self.assertEqual(self.sort(items, run_size),
+                             sorted(items, key=lambda item: item[0]))
+
+    def test_ties_keep_order(self):
+        items = [(0, 'a'), (0, 'b'), (0, 'c')]
+        self.assertEqual(self.sort(items, 2), items)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+from __future__ import print_function, unicode_literals
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from fungidb_tools import isf
+from fungidb_tools.gff import GFF3Parser as gp
+from fungidb_tools.gff.FastaIndex import FastaIndex, FastaSequence
+from fungidb_tools.gff.ParseCache import ParseCache
+
+GFF3 = ('##gff-version 3\n'
+        'ctgA\tt\tgene\t1\t10\t.\t+\t.\tID=g1\n'
+        '##FASTA\n'
+        '>ctgA\nACGTACGTAC\nGTAC\n'
+        '>ctgB\nTTTT\n')
+
+
+class FastaSectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 't.gff3')
+        with open(self.path, 'w') as outfile:
+            outfile.write(GFF3)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def sequences(self, items):
+        return [x for x in items if isinstance(x, FastaSequence)]
+
+    def test_indexed(self):
+        with open(self.path) as infile:
+            seqs = self.sequences(gp.GFF3Parser(fasta=True).parse(infile))
+        self.assertEqual([s.id for s in seqs], ['ctgA', 'ctgB'])
+        # Closed once the parse is done, and still readable, without
+        # leaving the file open or mapped.
+        index = seqs[0].index
+        self.assertIsNone(index._mm)
+        self.assertEqual(seqs[0].seq(9, 12), 'ACGT')
+        self.assertEqual(seqs[1].seq(), 'TTTT')
+        self.assertIsNone(index._mm)
+        self.assertIsNone(index._file)
+
+    def test_built(self):
+        with FastaIndex.from_gff3(self.path) as index:
+            self.assertIsNotNone(index._mm)
+            self.assertEqual(index.seq('ctgA', 13), 'AC')
+        self.assertIsNone(index._mm)
+        self.assertEqual(index.seq('ctgA', 13), 'AC')
+        self.assertIsNone(index._mm)
+
+    def test_compressed(self):
+        path = self.path + '.gz'
+        with isf.open_file(path, 'w') as outfile:
+            outfile.write(GFF3)
+        with isf.open_file(path) as infile:
+            records = list(gp.GFF3Parser(fasta=True).parse_flat(infile))[2:]
+        self.assertEqual([str(r.seq) for r in records],
+                         ['ACGTACGTACGTAC', 'TTTT'])
+
+    def test_pickle(self):
+        with open(self.path) as infile:
+            seq = self.sequences(gp.GFF3Parser(fasta=True).parse(infile))[1]
+        copy = pickle.loads(pickle.dumps(seq))
+        self.assertEqual(copy.seq(), 'TTTT')
+
+    def test_parse_cache(self):
+        cache = ParseCache(os.path.join(self.tmpdir, 'cache'))
+        for _ in range(2):
+            seqs = self.sequences(
+                cache.parse(gp.GFF3Parser(fasta=True), self.path))
+            self.assertEqual([s.seq() for s in seqs],
+                             ['ACGTACGTACGTAC', 'TTTT'])
+
+
+if __name__ == '__main__':
+    unittest.main()
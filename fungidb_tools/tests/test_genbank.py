@@ -0,0 +1,52 @@
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+from fungidb_tools.isf import genbank
+
+GENBANK = ('LOCUS       R1                        8 bp    DNA     linear   '
+           'UNK 01-JAN-1980\n'
+           'ORIGIN\n'
+           '        1 acgtacgt\n'
+           '//\n')
+
+
+class GenBankIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 't.gbf')
+        with open(self.path, 'w') as outfile:
+            outfile.write(GENBANK)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_saved(self):
+        index = genbank.GenBankIndex.open(self.path)
+        self.assertEqual([e.name for e in index], ['R1'])
+        loaded = genbank.GenBankIndex.load(self.path)
+        self.assertEqual([e.format() for e in loaded],
+                         [e.format() for e in index])
+
+    def test_rewritten_within_a_second(self):
+        genbank.GenBankIndex.open(self.path)
+        st = os.stat(self.path)
+        # Same size, same whole second: only the nanoseconds differ.
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        self.assertIsNone(genbank.GenBankIndex.load(self.path))
+
+    def test_save_failure_warns(self):
+        # A directory in the way of the temporary index file.
+        os.mkdir(genbank.GenBankIndex.index_path(self.path) + '~')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            index = genbank.GenBankIndex.open(self.path)
+        self.assertEqual(len(index), 1)
+        self.assertIn('Could not save index', str(caught[0].message))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from fungidb_tools.gff import GFF3Parser as gp
+from fungidb_tools.gff.GFF3Index import GFF3Index, MAGIC
+from fungidb_tools.tests.synthetic import gff3_lines, tree
+
+
+class CountingIndex(GFF3Index):
+
+    """GFF3Index that counts how often it scans the file."""
+
+    builds = 0
+
+    def build(self):
+        CountingIndex.builds += 1
+        GFF3Index.build(self)
+
+
+class GFF3IndexTest(unittest.TestCase):
+
+    def setUp(self):
+        CountingIndex.builds = 0
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 't.gff3')
+        # Shuffled, so a gene's rows are spread through the file.
+        self.lines = gff3_lines(20, shuffle='file')
+        self.write(self.lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, lines):
+        with open(self.path, 'w') as outfile:
+            outfile.write('\n'.join(lines) + '\n')
+
+    def test_build(self):
+        index = GFF3Index(self.path)
+        # 20 genes: gene, mRNA, two exons and one CDS ID each.
+        self.assertEqual(len(index), 100)
+        self.assertEqual(index.children['ctgA_g0'], ['ctgA_g0.t'])
+        self.assertEqual(sorted(index.children['ctgA_g0.t']),
+                         ['ctgA_g0.c', 'ctgA_g0.e0', 'ctgA_g0.e1'])
+        self.assertEqual(len(index.rows['ctgA_g0.c']), 2)
+        lines = index.lines('ctgA_g0.t')
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(all('ctgA_g0.' in line for line in lines))
+
+    def test_get_subtree(self):
+        index = GFF3Index(self.path)
+        expected = dict((f.id, tree(f)) for f in gp.GFF3Parser().parse(
+            self.lines) if isinstance(f, gp.GFF3Feature))
+        for id in ('ctgA_g0', 'ctgB_g7'):
+            self.assertEqual(tree(index.get(id)), expected[id])
+        mrna = index.get('ctgA_g0.t')
+        self.assertEqual(mrna.parents, ('ctgA_g0',))
+        self.assertEqual(len(mrna.children), 3)
+        with self.assertRaises(KeyError):
+            index.get('missing')
+
+    def test_save_load(self):
+        built = CountingIndex(self.path)
+        with open(built.index_path) as idx:
+            self.assertTrue(idx.readline().startswith(MAGIC + '\t'))
+        loaded = CountingIndex(self.path)
+        self.assertEqual(CountingIndex.builds, 1)
+        self.assertEqual(dict(loaded.rows), dict(built.rows))
+        self.assertEqual(dict(loaded.children), dict(built.children))
+        self.assertEqual(loaded.lines('ctgA_g0'), built.lines('ctgA_g0'))
+
+    def test_stale_sidecar(self):
+        CountingIndex(self.path)
+        # New rows near the top shift every offset after them.
+        lines = self.lines[:1] + [
+            'ctgA\tt\tgene\t90000\t90100\t.\t+\t.\tID=late',
+            'ctgA\tt\tmRNA\t90000\t90100\t.\t+\t.\tID=late.t;Parent=late'
+        ] + self.lines[1:]
+        self.write(lines)
+        index = CountingIndex(self.path)
+        self.assertEqual(CountingIndex.builds, 2)
+        self.assertEqual(len(index.lines('late')), 2)
+        expected = [tree(f) for f in gp.GFF3Parser().parse(lines)
+                    if isinstance(f, gp.GFF3Feature) and f.id == 'ctgA_g0']
+        self.assertEqual([tree(index.get('ctgA_g0'))], expected)
+
+    def test_extract_script(self):
+        script = os.path.join(os.path.dirname(__file__), os.pardir,
+                              os.pardir, 'scripts', 'isf',
+                              'extract_gff3_locus')
+        process = subprocess.Popen(
+            [sys.executable, script, self.path, 'ctgB_g1.t', 'missing'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        out, err = process.communicate()
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(sorted(out.splitlines()),
+                         sorted(l for l in self.lines if 'ctgB_g1.' in l))
+        self.assertIn('Not found: missing', err)
+
+
+if __name__ == '__main__':
+    unittest.main()
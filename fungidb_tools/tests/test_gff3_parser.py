@@ -0,0 +1,176 @@
+from __future__ import print_function, unicode_literals
+import unittest
+from collections import OrderedDict
+from fungidb_tools.gff import GFF3Parser as gp
+from fungidb_tools.tests.synthetic import gff3_lines, tree
+
+
+def rescan_tiers(feats):
+    """Nest features the way parse did before the pending-children map.
+
+    Every new feature rescans all of the children still waiting for a
+    parent, which is quadratic on out-of-order input but easy to trust.
+    """
+    features = OrderedDict()
+    buffer = set()
+    for feat in feats:
+        try:
+            f = features[feat.id]
+        except KeyError:
+            if feat.id is not None:
+                features[feat.id] = feat
+        else:
+            f.regions += feat.regions
+            feat = f
+
+        for f in list(buffer):
+            try:
+                for p in f.parents:
+                    features[p].add_child(f)
+            except KeyError:
+                pass
+            else:
+                buffer.remove(f)
+
+        for p in feat.parents:
+            try:
+                features[p].add_child(feat)
+            except KeyError:
+                buffer.add(feat)
+    assert not buffer, "Missing parents"
+    return [f for f in features.values() if not f.parents]
+
+
+def trees(items):
+    return [tree(f) for f in items if isinstance(f, gp.GFF3Feature)]
+
+
+class ParentResolutionTest(unittest.TestCase):
+
+    def assert_same_trees(self, lines):
+        expected = trees(rescan_tiers(
+            f for f in gp.GFF3Parser().parse_flat(lines)
+            if isinstance(f, gp.GFF3Feature)))
+        self.assertEqual(trees(gp.GFF3Parser().parse(lines)), expected)
+
+    def test_sorted(self):
+        self.assert_same_trees(gff3_lines(50))
+
+    def test_shuffled_file(self):
+        # Children usually arrive before their mRNA and gene.
+        self.assert_same_trees(gff3_lines(50, shuffle='file'))
+
+    def test_children_first(self):
+        lines = gff3_lines(20)
+        self.assert_same_trees(lines[:1] + lines[:0:-1])
+
+    def test_multiple_parents(self):
+        lines = [
+            'ctgA\tt\texon\t1\t50\t.\t+\t.\tID=e1;Parent=t1,t2',
+            'ctgA\tt\tmRNA\t1\t90\t.\t+\t.\tID=t2;Parent=g1',
+            'ctgA\tt\tgene\t1\t100\t.\t+\t.\tID=g1',
+            'ctgA\tt\tmRNA\t1\t100\t.\t+\t.\tID=t1;Parent=g1',
+        ]
+        self.assert_same_trees(lines)
+        gene, = gp.GFF3Parser().parse(lines)
+        for mrna in gene.children:
+            self.assertEqual([c.id for c in mrna.children], ['e1'])
+
+    def test_missing_parent(self):
+        lines = ['ctgA\tt\texon\t1\t50\t.\t+\t.\tID=e1;Parent=t1']
+        with self.assertRaises(gp.ParseError):
+            list(gp.GFF3Parser().parse(lines))
+
+
+class StreamTest(unittest.TestCase):
+
+    match = [
+        'ctgA\tt\tcDNA_match\t100\t200\t.\t+\t.\tID=m1',
+        'ctgA\tt\tgene\t300\t400\t.\t+\t.\tID=g1',
+        'ctgA\tt\tcDNA_match\t500\t600\t.\t+\t.\tID=m1',
+    ]
+
+    def assert_same_trees(self, lines, **kwargs):
+        expected = sorted(trees(gp.GFF3Parser().parse(lines)))
+        got = sorted(trees(gp.GFF3Parser(stream=True, **kwargs).parse(lines)))
+        self.assertEqual(got, expected)
+
+    def test_shuffled_contigs(self):
+        for seed in range(10):
+            lines = gff3_lines(600, shuffle='contig', seed=seed)
+            self.assert_same_trees(lines)
+            self.assert_same_trees(lines, max_features=100)
+            self.assert_same_trees(lines, max_features=1000)
+
+    def test_sorted(self):
+        lines = gff3_lines(600)
+        self.assert_same_trees(lines, sorted=True)
+        self.assert_same_trees(lines, sorted=True, max_features=50)
+
+    def test_multi_row_match(self):
+        self.assert_same_trees(self.match)
+        self.assert_same_trees(self.match, max_features=1)
+
+    def test_sorted_multi_row_match_released(self):
+        parser = gp.GFF3Parser(stream=True, sorted=True)
+        with self.assertRaises(gp.ParseError):
+            list(parser.parse(self.match))
+
+    def peak(self, lines, **kwargs):
+        tiers = gp.FeatureTiers(stream=True, **kwargs)
+        released = 0
+        for feat in gp.GFF3Parser().parse_flat(lines):
+            if isinstance(feat, gp.GFF3Feature):
+                released += len(list(tiers.add(feat)))
+        released += len(list(tiers.close()))
+        self.assertEqual(released, 601)
+        return tiers.peak
+
+    def test_whole_contig_row(self):
+        # A row spanning the contig stays open until the seqid changes; the
+        # genes inside it must still be released as they finish.
+        contig = 'ctgA\tt\tcontig\t1\t700000\t.\t.\t.\tID=ctgA'
+        lines = gff3_lines(600, contigs=('ctgA',))
+        self.assertLess(self.peak([contig] + lines[1:], sorted=True), 20)
+        lines = gff3_lines(600, contigs=('ctgA',), shuffle='contig')
+        peak = self.peak([contig] + lines[1:], max_features=100)
+        self.assertLessEqual(peak, 101)
+        self.assert_same_trees([contig] + lines, max_features=100)
+
+
+class CountingDict(dict):
+
+    """Dict that counts the lookups made in it."""
+
+    lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return dict.__getitem__(self, key)
+
+
+class ScalingTest(unittest.TestCase):
+
+    def lookups_per_row(self, lines):
+        tiers = gp.FeatureTiers()
+        tiers.features = CountingDict()
+        rows = 0
+        for feat in gp.GFF3Parser().parse_flat(lines):
+            if isinstance(feat, gp.GFF3Feature):
+                list(tiers.add(feat))
+                rows += 1
+        self.assertEqual(len(list(tiers.close())), len(lines) // 6)
+        return tiers.features.lookups / rows
+
+    def test_shuffled_input_scales_linearly(self):
+        # The rescan looks up every waiting child again for each new row;
+        # here a row costs one lookup for its ID and one per parent,
+        # however many rows came before.  Timings are in benchmark.py.
+        small = self.lookups_per_row(gff3_lines(1000, shuffle='file'))
+        large = self.lookups_per_row(gff3_lines(4000, shuffle='file'))
+        self.assertLessEqual(small, 2)
+        self.assertLessEqual(large, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+from __future__ import print_function, unicode_literals
+import random
+import unittest
+from fungidb_tools.gff import GFF3Parser as gp
+from fungidb_tools.gff.IntervalIndex import IntervalIndex
+from fungidb_tools.tests.synthetic import gff3_lines
+
+
+def random_intervals(n, seed, seqids=('ctgA', 'ctgB')):
+    """Return (seqid, start, end) triples, many nested or identical."""
+    rng = random.Random(seed)
+    intervals = []
+    for _ in range(n):
+        roll = rng.random()
+        if intervals and roll < 0.2:
+            # Identical to an earlier interval.
+            intervals.append(rng.choice(intervals))
+        elif intervals and roll < 0.5:
+            # Nested in, or sharing a start or end with, an earlier one.
+            seqid, start, end = rng.choice(intervals)
+            a = rng.randint(start, end)
+            b = rng.randint(a, end)
+            intervals.append(rng.choice(((seqid, a, b), (seqid, start, b),
+                                         (seqid, a, end))))
+        else:
+            start = rng.randint(1, 1000)
+            intervals.append((rng.choice(seqids), start,
+                              start + rng.randint(0, 200)))
+    return intervals
+
+
+class IntervalIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.intervals = random_intervals(400, seed=1)
+        # Index positions, so identical intervals are still told apart.
+        self.index = IntervalIndex(range(len(self.intervals)),
+                                   key=self.intervals.__getitem__)
+
+    def scan(self, test):
+        return sorted(i for i, iv in enumerate(self.intervals) if test(*iv))
+
+    def queries(self):
+        rng = random.Random(2)
+        for seqid, start, end in self.intervals[:100]:
+            yield seqid, start, end
+        for _ in range(200):
+            start = rng.randint(-10, 1250)
+            yield rng.choice(('ctgA', 'ctgB', 'ctgC')), start, start + \
+                rng.randint(0, 300)
+
+    def test_overlapping(self):
+        for seqid, start, end in self.queries():
+            self.assertEqual(
+                sorted(self.index.overlapping(seqid, start, end)),
+                self.scan(lambda s, a, b: s == seqid and a <= end and
+                          b >= start))
+
+    def test_containing(self):
+        for seqid, start, end in self.queries():
+            self.assertEqual(
+                sorted(self.index.containing(seqid, start, end)),
+                self.scan(lambda s, a, b: s == seqid and a <= start and
+                          b >= end))
+
+    def test_contained(self):
+        for seqid, start, end in self.queries():
+            self.assertEqual(
+                sorted(self.index.contained(seqid, start, end)),
+                self.scan(lambda s, a, b: s == seqid and a >= start and
+                          b <= end))
+
+    def test_nearest(self):
+        for seqid, start, end in self.queries():
+            hits = self.index.nearest(seqid, start, end)
+            overlaps = self.scan(lambda s, a, b: s == seqid and
+                                 a <= end and b >= start)
+            if overlaps:
+                self.assertEqual(sorted(hits), overlaps)
+                continue
+            gaps = dict((i, max(a - end, start - b))
+                        for i, (s, a, b) in enumerate(self.intervals)
+                        if s == seqid)
+            if not gaps:
+                self.assertEqual(hits, [])
+                continue
+            best = min(gaps.values())
+            for hit in hits:
+                self.assertEqual(gaps[hit], best)
+            self.assertTrue(hits)
+
+    def test_identical_and_nested(self):
+        index = IntervalIndex(['outer', 'twin1', 'twin2', 'inner'], key={
+            'outer': ('c', 1, 100), 'twin1': ('c', 10, 50),
+            'twin2': ('c', 10, 50), 'inner': ('c', 20, 30)}.__getitem__)
+        self.assertEqual(sorted(index.containing('c', 20, 30)),
+                         ['inner', 'outer', 'twin1', 'twin2'])
+        self.assertEqual(sorted(index.contained('c', 10, 50)),
+                         ['inner', 'twin1', 'twin2'])
+        self.assertEqual(sorted(index.overlapping('c', 51, 60)), ['outer'])
+        self.assertEqual(list(index.find_uncontained(['outer', 'twin1'])),
+                         ['outer'])
+
+    def test_features(self):
+        genes = [f for f in gp.GFF3Parser().parse(gff3_lines(10))
+                 if isinstance(f, gp.GFF3Feature)]
+        index = IntervalIndex(genes)
+        self.assertEqual(len(index), 10)
+        gene = genes[0]
+        self.assertEqual(index.overlapping(gene.seqid, 1, 1), [gene])
+        for item, hits in index.find_overlaps(genes):
+            self.assertEqual(hits, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,16 @@
+from __future__ import print_function, unicode_literals
+import unittest
+from fungidb_tools.tests.benchmark import memory
+
+
+class MemoryTest(unittest.TestCase):
+
+    def test_rows_three_times_smaller(self):
+        # Rows with a Name, product and Note, whose attributes column is
+        # kept as read until something looks at it.
+        for name, old, new in memory(genes=500):
+            self.assertGreaterEqual(old / new, 3, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
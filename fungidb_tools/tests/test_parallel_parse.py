@@ -0,0 +1,130 @@
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+from fungidb_tools.gff import GFF3Parser as gp
+from fungidb_tools.gff import ParallelParse, ParallelRanges
+from fungidb_tools.isf import parse_gff
+from fungidb_tools.tests.synthetic import gene_rows, format_row, gff3_lines
+
+CONTIGS = ('ctgA', 'ctgB', 'ctgC', 'ctgD')
+
+
+def gff3_text(genes=30, separators=False):
+    """Per-contig directives, rows and a comment, an optional ### after each
+    contig, then a ##FASTA section."""
+    lines = ['##gff-version 3']
+    for seqid in CONTIGS:
+        lines.append('##sequence-region {} 1 100000'.format(seqid))
+        for gene in range(genes):
+            lines += [format_row(row) for row in
+                      gene_rows(gene, seqid, 1 + gene * 1000)]
+            if gene == genes // 2:
+                lines.append('# halfway along ' + seqid)
+        if separators:
+            lines.append('###')
+    lines.append('##FASTA')
+    for seqid in CONTIGS:
+        lines += ['>' + seqid, 'ACGT' * 15, 'ACG']
+    return '\n'.join(lines) + '\n'
+
+
+def described(items):
+    return [(type(item).__name__, str(item)) for item in items]
+
+
+class ParallelParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.min_range_size = ParallelRanges.MIN_RANGE_SIZE
+        # Cut the small test files into several ranges.
+        ParallelRanges.MIN_RANGE_SIZE = 1
+
+    def tearDown(self):
+        ParallelRanges.MIN_RANGE_SIZE = self.min_range_size
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, text):
+        path = os.path.join(self.tmpdir, 't.gff3')
+        with open(path, 'w') as outfile:
+            outfile.write(text)
+        self.assertGreater(len(ParallelParse.split_ranges(path, 8)), 4)
+        return path
+
+    def assert_same(self, parser, path, method='parse', jobs=2, **kwargs):
+        with open(path) as infile:
+            expected = described(getattr(parser, method)(infile, **kwargs))
+        got = described(ParallelParse.parse_parallel(parser, path, method,
+                                                     jobs=jobs, **kwargs))
+        self.assertEqual(got, expected)
+
+    def test_gff3(self):
+        for separators in (False, True):
+            path = self.write(gff3_text(separators=separators))
+            for stream in (False, True):
+                parser = gp.GFF3Parser(fasta=True, stream=stream)
+                self.assert_same(parser, path)
+                self.assert_same(parser, path, jobs=1)
+            self.assert_same(gp.GFF3Parser(fasta=True, stream=True,
+                                           max_features=20), path)
+            self.assert_same(gp.GFF3Parser(fasta=True), path, 'parse_flat')
+
+    def test_fasta_sequences(self):
+        path = self.write(gff3_text())
+        items = list(ParallelParse.parse_parallel(
+            gp.GFF3Parser(fasta=True), path, jobs=2))
+        seqs = [item for item in items if type(item).__name__ ==
+                'FastaSequence']
+        self.assertEqual([s.id for s in seqs], list(CONTIGS))
+        self.assertEqual(seqs[0].seq(58, 63), 'CGTACG')
+        seqs[0].index.close()
+
+    def assert_same_output(self, parser, path, method, **kwargs):
+        """Compare the comment file and results written to one stream."""
+        expected = io.StringIO()
+        with open(path) as infile:
+            for feat in getattr(parser, method)(infile, expected, **kwargs):
+                expected.write(str(feat) + '\n')
+        got = io.StringIO()
+        for feat in ParallelParse.parse_parallel(
+                parser, path, method, jobs=2, commentfile=got, **kwargs):
+            got.write(str(feat) + '\n')
+        self.assertEqual(got.getvalue(), expected.getvalue())
+
+    def test_parse_gff_comments(self):
+        parser = parse_gff.GFFParser('gff3', fasta=True)
+        for separators in (False, True):
+            path = self.write(gff3_text(separators=separators))
+            self.assert_same_output(parser, path, 'parse')
+            self.assert_same_output(parser, path, 'parse_flat')
+            for stream in (False, True):
+                self.assert_same_output(parser, path, 'parse_3level',
+                                        stream=stream)
+
+    def test_interleaved_contigs(self):
+        # Children in one contig's later rows, parents in an earlier range.
+        lines = gff3_lines(40, contigs=CONTIGS, shuffle='file')
+        path = self.write('\n'.join(lines) + '\n')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assert_same(gp.GFF3Parser(), path)
+            self.assert_same_output(parse_gff.GFFParser('gff3'), path,
+                                    'parse_3level', stream=False)
+        self.assertEqual(len(self.serially(caught)), 2)
+        # Flat rows don't need their contig's rows together.
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assert_same(gp.GFF3Parser(), path, 'parse_flat')
+        self.assertEqual(self.serially(caught), [])
+
+    @staticmethod
+    def serially(caught):
+        return [w for w in caught if 'parsing it serially' in str(w.message)]
+
+
+if __name__ == '__main__':
+    unittest.main()
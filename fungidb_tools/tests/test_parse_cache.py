@@ -0,0 +1,107 @@
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from fungidb_tools.gff import GFF3Parser as gp
+from fungidb_tools.gff.ParseCache import ParseCache, SUFFIX
+from fungidb_tools.isf import parse_gff
+from fungidb_tools.tests.synthetic import gff3_lines
+
+
+class CountingParser(gp.GFF3Parser):
+
+    """GFF3Parser that counts how often it really parses."""
+
+    parses = 0
+
+    def parse(self, infile):
+        CountingParser.parses += 1
+        return gp.GFF3Parser.parse(self, infile)
+
+
+def described(items):
+    return [(type(item).__name__, str(item)) for item in items]
+
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ParseCache(os.path.join(self.tmpdir, 'cache'))
+        CountingParser.parses = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, lines):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as outfile:
+            outfile.write('\n'.join(lines) + '\n')
+        return path
+
+    def cached(self):
+        return sorted(name for name in os.listdir(self.cache.directory)
+                      if name.endswith(SUFFIX))
+
+    def test_hit(self):
+        path = self.write('t.gff3', gff3_lines(20))
+        with open(path) as infile:
+            expected = described(gp.GFF3Parser().parse(infile))
+        for _ in range(3):
+            got = described(self.cache.parse(CountingParser(), path))
+            self.assertEqual(got, expected)
+        self.assertEqual(CountingParser.parses, 1)
+        self.assertEqual(len(self.cached()), 1)
+
+    def test_comments_replayed(self):
+        lines = gff3_lines(5)
+        path = self.write('t.gff3', lines[:3] + ['# a comment'] + lines[3:])
+        parser = parse_gff.GFFParser('gff3', comments=True)
+        outputs = []
+        for _ in range(2):
+            commentfile = io.StringIO()
+            feats = self.cache.parse(parser, path, commentfile=commentfile)
+            outputs.append((described(feats), commentfile.getvalue()))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0][1], '##gff-version 3\n# a comment\n')
+
+    def test_changed_input(self):
+        path = self.write('t.gff3', gff3_lines(20))
+        list(self.cache.parse(CountingParser(), path))
+        # A new mtime alone is still a hit: the key is the contents' SHA-1.
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        list(self.cache.parse(CountingParser(), path))
+        self.assertEqual(CountingParser.parses, 1)
+        # Same size, different contents.
+        lines = gff3_lines(20)
+        lines[1] = lines[1].replace('\ttest\t', '\ttset\t')
+        self.write('t.gff3', lines)
+        feats = list(self.cache.parse(CountingParser(), path))
+        self.assertEqual(CountingParser.parses, 2)
+        self.assertEqual(feats[1].source, 'tset')
+        self.assertEqual(len(self.cached()), 2)
+
+    def test_trim_least_recently_used(self):
+        paths = [self.write(name, gff3_lines(10 + i))
+                 for i, name in enumerate(('a.gff3', 'b.gff3', 'c.gff3'))]
+        names = []
+        for age, path in zip((300, 200, 100), paths):
+            list(self.cache.parse(gp.GFF3Parser(), path))
+            name, = set(self.cached()) - set(names)
+            names.append(name)
+            then = time.time() - age
+            os.utime(os.path.join(self.cache.directory, name), (then, then))
+        # A hit makes a.gff3's file the most recently used.
+        list(self.cache.parse(gp.GFF3Parser(), paths[0]))
+        sizes = dict((name, os.path.getsize(
+            os.path.join(self.cache.directory, name))) for name in names)
+        self.cache.max_size = sizes[names[0]] + sizes[names[2]]
+        self.cache.trim()
+        self.assertEqual(self.cached(), sorted((names[0], names[2])))
+
+
+if __name__ == '__main__':
+    unittest.main()
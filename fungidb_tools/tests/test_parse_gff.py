@@ -0,0 +1,121 @@
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import warnings
+from fungidb_tools.isf import parse_gff
+from fungidb_tools.tests.synthetic import gff3_lines
+
+
+def tree(feat):
+    """Return a comparable (id, type, positions, children) nesting."""
+    children = tuple(tree(c) for c in feat.children)
+    return feat.attr['ID'], feat.soterm, tuple(sorted(feat.pos)), children
+
+
+class SortTest(unittest.TestCase):
+
+    def parse(self, lines):
+        parser = parse_gff.GFFParser('gff3')
+        return parser.parse(lines, io.StringIO())
+
+    def test_interleaved_contigs(self):
+        lines = gff3_lines(20, shuffle='file')
+        expected = parse_gff.sort_features(
+            parse_gff.nest_features(self.parse(lines), stream=False))
+        got = parse_gff.sort_trees(self.parse(lines), run_size=7)
+        self.assertEqual([tree(f) for f in got], [tree(f) for f in expected])
+
+    def test_orphans_placed_once(self):
+        # Each exon names two parents that never arrive.
+        lines = ['ctgA\tt\texon\t{0}\t{0}\t.\t+\t.\tID=e{0};Parent=m{0},x{0}'
+                 .format(i) for i in range(1, 6)]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            tops = list(parse_gff.nest_features(self.parse(lines)))
+        self.assertEqual([f.attr['ID'] for f in tops],
+                         ['e1', 'e2', 'e3', 'e4', 'e5'])
+
+
+class FormatGFFTest(unittest.TestCase):
+
+    script = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                          'scripts', 'isf', 'format_gff')
+    gff3 = ('##gff-version 3\n'
+            'ctgB\tt\tgene\t50\t90\t.\t+\t.\tID=g2\n'
+            'ctgA\tt\tgene\t1\t10\t.\t+\t.\tID=g1\n'
+            '##FASTA\n'
+            '>ctgA\nACGT\n')
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 't.gff3')
+        with open(self.path, 'w') as outfile:
+            outfile.write(self.gff3)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def format_gff(self, *args):
+        return subprocess.check_output(
+            [sys.executable, self.script, self.path, '-t', 'gff3'] +
+            list(args) + ['--soterm', 'Chr', '--regex', r'ctg(?P<letter>\w)'],
+            universal_newlines=True).splitlines()
+
+    def test_sort_keeps_fasta_last(self):
+        for jobs in ('1', '2'):
+            lines = self.format_gff('--sort', '--fasta', '--jobs', jobs)
+            self.assertEqual([l.split('\t')[-1] for l in lines],
+                             ['##gff-version 3', 'ID=g1', 'ID=g2',
+                              '##FASTA', '>ctgA', 'ACGT'])
+
+
+class ConvertGTFTest(unittest.TestCase):
+
+    script = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                          'scripts', 'isf', 'convert_gtf')
+    # Rows of G1 on either side of a ctgB row; T4 is also its gene_id.
+    gtf = [
+        ('ctgA', 'exon', 100, 200, 'gene_id "G1"; transcript_id "T1";'),
+        ('ctgB', 'exon', 10, 50, 'gene_id "G2"; transcript_id "T3";'),
+        ('ctgA', 'exon', 300, 400, 'gene_id "G1"; transcript_id "T1";'),
+        ('ctgA', 'exon', 150, 250, 'gene_id "G1"; transcript_id "T2";'),
+        ('ctgB', 'exon', 60, 80, 'gene_id "T4"; transcript_id "T4";'),
+    ]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_interleaved_contigs(self):
+        path = os.path.join(self.tmpdir, 't.gtf')
+        with open(path, 'w') as outfile:
+            for seqid, soterm, start, end, attributes in self.gtf:
+                outfile.write('\t'.join((seqid, 't', soterm, str(start),
+                                         str(end), '.', '+', '.',
+                                         attributes)) + '\n')
+        out = subprocess.check_output([sys.executable, self.script, path],
+                                      universal_newlines=True)
+        rows = [line.split('\t') for line in out.splitlines()[1:]]
+        spans = dict((row[8], (row[0], int(row[3]), int(row[4])))
+                     for row in rows if row[2] in ('gene', 'mRNA'))
+        self.assertEqual(spans, {
+            'ID=G1': ('ctgA', 100, 400),
+            'ID=T1;Parent=G1': ('ctgA', 100, 400),
+            'ID=T2;Parent=G1': ('ctgA', 150, 250),
+            'ID=G2': ('ctgB', 10, 50),
+            'ID=T3;Parent=G2': ('ctgB', 10, 50),
+            'ID=T4G': ('ctgB', 60, 80),
+            'ID=T4;Parent=T4G': ('ctgB', 60, 80),
+        })
+        self.assertEqual(len(rows), len(spans) + len(self.gtf))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+from __future__ import print_function, unicode_literals
+import io
+import unittest
+import warnings
+from fungidb_tools.isf.products import ColumnError, tsv_products
+
+KOG = ('#proteinId\ttranscriptId\tkogid\tkogdefline\tkogClass\n'
+       '1\tt1\tKOG1\tkinase\tsignal\tignored\textra\n'
+       '2\tt2\tKOG2\tkinase\tsignal\n'
+       '3\tt3\tKOG3\tligase\tsignal\n'
+       '1\tt1\tKOG1\tkinase\tsignal\n'
+       '\n'
+       '4\tt3\tKOG4\tprotease\tsignal\n'
+       '5\tt3\tKOG4\tprotease\tsignal\n'
+       '1\tt1\tKOG1\tkinase\tsignal\n')
+
+
+def products(text, *args, **kwargs):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        rows = list(tsv_products(io.StringIO(text), *args, **kwargs))
+    return rows, [str(w.message) for w in caught]
+
+
+class TSVProductsTest(unittest.TestCase):
+
+    def test_columns(self):
+        rows, messages = products(KOG, 'transcriptId',
+                                  ['kogClass', 'kogdefline'])
+        self.assertEqual(rows[0], ('t1', 'signal', 'kinase'))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(messages, [])
+        with self.assertRaises(ColumnError):
+            products(KOG, 'transcriptId', ['missing'])
+
+    def test_unique(self):
+        rows, messages = products(KOG, 'transcriptId', ['kogdefline'],
+                                  prefix='ncra', unique=True)
+        # t1's repeats are dropped though other rows come between them;
+        # t2 is kept though the row before it has the same kogdefline.
+        self.assertEqual(rows, [('ncra_t1', 'kinase'), ('ncra_t2', 'kinase'),
+                                ('ncra_t3', 'ligase'),
+                                ('ncra_t3', 'protease')])
+        self.assertEqual(messages, ['Non-unique key: ncra_t3'])
+
+    def test_unique_compares_saved_columns(self):
+        # Rows that differ only in columns that aren't saved are repeats.
+        rows, messages = products(KOG, 'transcriptId', ['kogid'],
+                                  unique=True)
+        self.assertEqual(rows, [('t1', 'KOG1'), ('t2', 'KOG2'),
+                                ('t3', 'KOG3'), ('t3', 'KOG4')])
+        self.assertEqual(messages, ['Non-unique key: t3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
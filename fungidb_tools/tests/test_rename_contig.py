@@ -0,0 +1,141 @@
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from fungidb_tools.isf import rename_contig as rc
+
+SCRIPT = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                      'scripts', 'isf', 'gen_fasta_chr_map')
+
+NAMES = ['Supercontig_12.1 of Neurospora crassa', 'Chr_4', 'chrV',
+         'Chr_B', 'LG_7 linkage group', 'scaffold_31', 'unplaced']
+
+
+class CombineRegexTest(unittest.TestCase):
+
+    def test_branch_order(self):
+        combined = rc.combine_regex([r'LG_(?P<number>\d+)',
+                                     r'(?P<number>\d+)'])
+        match = combined.match('scaffold_2 LG_7')
+        # The first pattern wins even though the second matches earlier.
+        self.assertEqual(match.lastgroup, '_b0')
+        self.assertEqual(match.group('_b0_number'), '7')
+        self.assertEqual(combined.match('scaffold_2').lastgroup, '_b1')
+        self.assertIsNone(combined.match('unplaced'))
+
+    def test_same_as_separate_searches(self):
+        regex = (r'Supercontig_(?P<number>\d+)', r'Chr_(?P<letter>[A-Z])$',
+                 r'Chr_(?P<number>\d+)', r'chr(?P<roman>[XIV]+)',
+                 r'LG_(?P<number>\d+)')
+        soterm = ('SC', 'Chr', 'Chr', 'Chr', 'LG')
+        combined = rc.ContigRenamer('ncra', 2, soterm, regex)
+        self.assertIsNotNone(combined.combined)
+        separate = rc.ContigRenamer('ncra', 2, soterm, regex)
+        separate.combined = None
+        self.assertEqual(combined.rename_many(NAMES),
+                         separate.rename_many(NAMES))
+        self.assertEqual(combined.rename_many(NAMES), {
+            NAMES[0]: 'ncra_SC12', NAMES[1]: 'ncra_Chr04',
+            NAMES[2]: 'ncra_ChrV', NAMES[3]: 'ncra_ChrB',
+            NAMES[4]: 'ncra_LG07'})
+
+    def test_not_combined(self):
+        self.assertIsNone(rc.combine_regex([r'(a)\1', r'b']))
+        self.assertIsNone(rc.combine_regex([r'a', r'(?i)b']))
+        renamer = rc.ContigRenamer('ncra', 2, ('Chr',),
+                                   (r'(?P<number>\d)\1',))
+        self.assertIsNone(renamer.combined)
+        self.assertEqual(renamer.rename('Chr_33'), 'ncra_Chr03')
+        with self.assertRaises(rc.NoMatchException):
+            renamer.rename('Chr_34')
+
+
+class ContigMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.contigs = rc.ContigMap()
+        for old, new in (('Supercontig_1', 'ncra_SC01'),
+                         ('chrIV', 'ncra_ChrIV'),
+                         ('scaffold_3', 'ncra_scaffold03')):
+            self.contigs.add(old, new)
+
+    def test_add(self):
+        self.assertEqual(self.contigs.entries, [
+            ('Supercontig_1', 'ncra_SC01', '1'),
+            ('chrIV', 'ncra_ChrIV', '4'),
+            ('scaffold_3', 'ncra_scaffold03', '.')])
+        self.assertEqual(self.contigs.rename('chrIV'), 'ncra_ChrIV')
+        self.assertEqual(self.contigs.rename_many(['chrIV', 'missing']),
+                         {'chrIV': 'ncra_ChrIV'})
+        with self.assertRaises(rc.NoMatchException):
+            self.contigs.rename('missing')
+
+    def test_save_load(self):
+        saved = io.StringIO()
+        self.contigs.save(saved)
+        self.assertEqual(saved.getvalue().splitlines()[1],
+                         'chrIV\tncra_ChrIV\t4\t2')
+        loaded = rc.ContigMap.load(io.StringIO(
+            '# old\tnew\tchromosome\torder\n\n' + saved.getvalue()))
+        self.assertEqual(loaded.entries, self.contigs.entries)
+        self.assertEqual(loaded.names, self.contigs.names)
+
+    def test_write_chromosome_map(self):
+        with self.assertRaises(rc.NoMatchException):
+            self.contigs.write_chromosome_map(io.StringIO())
+        del self.contigs.entries[-1]
+        outfile = io.StringIO()
+        self.contigs.write_chromosome_map(outfile)
+        self.assertEqual(outfile.getvalue(),
+                         'ncra_SC01\t1\t1\nncra_ChrIV\t4\t2\n')
+
+    def test_write_chromosome_map_regex(self):
+        outfile = io.StringIO()
+        self.contigs.write_chromosome_map(
+            outfile, (r'_SC(?P<number>\d+)$', r'_Chr(?P<roman>[XIV]+)$',
+                      r'scaffold(?P<number>\d+)$'))
+        self.assertEqual(outfile.getvalue(), 'ncra_SC01\t1\t1\n'
+                         'ncra_ChrIV\t4\t2\nncra_scaffold03\t3\t3\n')
+        with self.assertRaises(rc.NoMatchException):
+            self.contigs.write_chromosome_map(io.StringIO(),
+                                              (r'_SC(?P<number>\d+)$',))
+
+
+class GenFastaChrMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'contigs.map')
+        with open(self.path, 'w') as outfile:
+            outfile.write('Supercontig_1\tncra_SC01\t1\t1\n'
+                          'scaffold_3\tncra_scaffold03\t.\t2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_script(self, *args):
+        process = subprocess.Popen(
+            [sys.executable, SCRIPT, '--contig-map', self.path] + list(args),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True)
+        out, err = process.communicate('')
+        return process.returncode, out, err
+
+    def test_saved_chromosomes(self):
+        returncode, out, err = self.run_script()
+        self.assertNotEqual(returncode, 0)
+        self.assertIn('No chromosome in ncra_scaffold03', err)
+
+    def test_regex(self):
+        returncode, out, err = self.run_script(
+            '--regex', r'_SC(?P<number>\d+)$', r'scaffold(?P<number>\d+)$')
+        self.assertEqual(returncode, 0)
+        self.assertEqual(out, 'ncra_SC01\t1\t1\nncra_scaffold03\t3\t2\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+from __future__ import print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    from fungidb_tools import simple_eutils as eutils
+except ImportError:
+    eutils = None
+else:
+    from fungidb_tools.simple_eutils import simple_eutils
+    from fungidb_tools.simple_eutils.response_cache import ResponseCache
+
+SEARCH = ('<eSearchResult><Count>{count}</Count>{history}'
+          '<IdList>{ids}</IdList></eSearchResult>')
+
+
+class FakeEntrez(object):
+
+    """Stands in for Bio.Entrez, answering esearch from a list of ids."""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.calls = []
+
+    def esearch(self, **params):
+        self.calls.append(params)
+        start, retmax = params['retstart'], params['retmax']
+        history = ''
+        if params.get('usehistory'):
+            history = '<WebEnv>W1</WebEnv><QueryKey>1</QueryKey>'
+        page = ''.join('<Id>{}</Id>'.format(id)
+                       for id in self.ids[start:start + retmax])
+        return io.BytesIO(SEARCH.format(count=len(self.ids), history=history,
+                                        ids=page).encode('utf-8'))
+
+
+@unittest.skipIf(eutils is None, "needs Bio and decorator")
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.tmpdir, 'eutils.db'),
+                                   ttl=60)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmpdir)
+
+    def age(self, column, seconds, **params):
+        key, _ = self.cache.key('efetch', params)
+        with self.cache._db:
+            self.cache._db.execute(
+                'UPDATE responses SET {} = ? WHERE key = ?'.format(column),
+                (time.time() - seconds, key))
+
+    def test_key(self):
+        self.assertEqual(self.cache.key('efetch', {'id': ['1', '2']}),
+                         self.cache.key('efetch', {'id': '1,2',
+                                                   'retmax': None}))
+        self.assertNotEqual(self.cache.key('efetch', {'id': '1'}),
+                            self.cache.key('esummary', {'id': '1'}))
+
+    def test_ttl(self):
+        self.cache.put('efetch', {'id': '1'}, b'<a/>')
+        self.assertEqual(self.cache.get('efetch', {'id': '1'}), b'<a/>')
+        self.age('created', 120, id='1')
+        self.assertIsNone(self.cache.get('efetch', {'id': '1'}))
+        # Offline, an expired response is still served.
+        self.cache.offline = True
+        self.assertEqual(self.cache.get('efetch', {'id': '1'}), b'<a/>')
+        self.cache.trim()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used(self):
+        for id in 'abc':
+            self.cache.put('efetch', {'id': id}, b'x' * 10)
+        self.age('accessed', 300, id='a')
+        self.age('accessed', 200, id='b')
+        self.age('accessed', 100, id='c')
+        # A hit makes a the most recently used.
+        self.cache.get('efetch', {'id': 'a'})
+        self.cache.max_size = 15
+        self.cache.trim()
+        self.assertIsNone(self.cache.get('efetch', {'id': 'b'}))
+        self.assertIsNone(self.cache.get('efetch', {'id': 'c'}))
+        self.assertEqual(self.cache.get('efetch', {'id': 'a'}), b'x' * 10)
+
+    def test_put_trims(self):
+        self.cache.max_size = 25
+        for id in 'abc':
+            self.cache.put('efetch', {'id': id}, b'x' * 10)
+        self.assertEqual(len(self.cache), 2)
+
+
+@unittest.skipIf(eutils is None, "needs Bio and decorator")
+class RequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.tmpdir, 'eutils.db'))
+        self.entrez = FakeEntrez([str(i) for i in range(5)])
+        self.saved = simple_eutils.Entrez
+        simple_eutils.Entrez = self.entrez
+        eutils.set_cache(self.cache)
+
+    def tearDown(self):
+        simple_eutils.Entrez = self.saved
+        eutils.set_cache(None)
+        self.cache.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_term_pages_cached(self):
+        ids = eutils.idlist_search('gene', term='kinase', retmax=2)
+        self.assertEqual(ids, ['0', '1', '2', '3', '4'])
+        self.assertEqual([c['retstart'] for c in self.entrez.calls],
+                         [0, 2, 4])
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual(eutils.idlist_search('gene', term='kinase',
+                                              retmax=2), ids)
+        self.assertEqual(len(self.entrez.calls), 3)
+
+    def test_webenv_not_cached(self):
+        for _ in range(2):
+            ids = eutils.idlist_search('gene', webenv='W0', query_key='1',
+                                       retmax=2)
+            self.assertEqual(ids, ['0', '1', '2', '3', '4'])
+        self.assertEqual(len(self.entrez.calls), 6)
+        # Later pages follow the session the first page returned.
+        self.assertEqual(self.entrez.calls[1]['webenv'], 'W1')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_offline_miss(self):
+        eutils.idlist_search('gene', term='kinase', retmax=5)
+        self.cache.offline = True
+        self.assertEqual(eutils.idlist_search('gene', term='kinase',
+                                              retmax=5), self.entrez.ids)
+        with self.assertRaises(eutils.CacheMiss):
+            eutils.idlist_search('gene', term='ligase', retmax=5)
+        self.assertEqual(len(self.entrez.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
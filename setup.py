@@ -30,6 +30,7 @@ setup(name='fungidb_tools',
           'scripts/isf/split_algids',
           'scripts/isf/undo_algids',
           'scripts/isf/extract_gff3_attr',
+          'scripts/isf/extract_gff3_locus',
           'scripts/isf/extract_products_broad',
           'scripts/isf/extract_products_genbank',
           'scripts/isf/extract_products_jgi',
@@ -43,4 +44,8 @@ setup(name='fungidb_tools',
           'lxml',
           'gspread',
           'decorator',
-      ],)
+      ],
+
+      extras_require={
+          'columnar': ['numpy'],
+      },)